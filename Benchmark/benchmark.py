@@ -0,0 +1,184 @@
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import importlib.util
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sbox_modeling.batch import load_sboxes, write_atomic
+from sbox_modeling.milp import solve_seconds
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Every method: its script, the run_sbox options used for the benchmark, and for every result file it
+# writes (relative to its working directory) the checked-in file holding the baseline for it
+METHODS = {
+    "direct": {
+        "script": "Direct Inequality Generation/direct_inequality_generation.py",
+        "options": {"a_bound": 500, "b_bound": 500, "persistent": True},
+        "files": lambda name, bits: {
+            "": (f"{name}_500_500.txt", f"Direct Inequality Generation/{bits}-bit_sboxes_500_500/{name}.txt")},
+    },
+    "greedy": {
+        "script": "Greedy Generation and Reduction/greedy_generation_and_reduction.py",
+        "options": {},
+        "files": lambda name, bits: {
+            "": (f"{name}.txt", f"Greedy Generation and Reduction/Results/{name}.txt")},
+    },
+    "iterative": {
+        "script": "Iterative Inequality Augmentation/iterative_inequality_augmentation.py",
+        "options": {},
+        "files": lambda name, bits: {
+            "": (f"{bits}-bit_sboxes/{name}_improved_MILP.txt", f"Iterative Inequality Augmentation/{bits}-bit_sboxes/{name}_improved_MILP.txt")},
+    },
+    "modified": {
+        "script": "Modified Greedy Approach/modified_greedy_approach.py",
+        "options": {},
+        "files": lambda name, bits: {
+            "first": (f"{name}_first.txt", f"Modified Greedy Approach/Results/{name}_first.txt"),
+            "last": (f"{name}_last.txt", f"Modified Greedy Approach/Results/{name}_last.txt"),
+            "mid": (f"{name}_mid.txt", f"Modified Greedy Approach/Results/{name}_mid.txt"),
+            "rand": (f"Random/{name}_rand.txt", f"Modified Greedy Approach/Results/{name}_rand.txt")},
+    },
+}
+
+
+def count_inequalities(path):
+    # Number of inequality lines in a result file, None when there is no such file
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return sum(1 for line in f if line.startswith('['))
+
+
+def load_method(method):
+    path = os.path.join(ROOT, METHODS[method]["script"])
+    spec = importlib.util.spec_from_file_location(f"benchmark_{method}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_job(method, raw_sbox, threads, workdir, queue, cold_cache=True):
+    # Runs in its own process, so peak RSS and solver time belong to this job alone. The result store always,
+    # and with cold_cache the hull cache too, live in the job's scratch directory, so a job never reads what an
+    # earlier run left at the repository root and its time includes the hull step
+    try:
+        os.chdir(workdir)
+        os.environ["SBOX_RESULTS_DIR"] = os.path.join(workdir, "results_store")
+        if cold_cache:
+            os.environ["SBOX_CACHE_DIR"] = os.path.join(workdir, "hull_cache")
+        module = load_method(method)
+        start = time.time()
+        module.run_sbox(raw_sbox, threads, **METHODS[method]["options"])
+        wall = time.time() - start
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        queue.put({"wall": wall, "solver": solve_seconds(), "peak_rss_mb": rss, "error": None})
+    except Exception as e:
+        queue.put({"error": repr(e)})
+
+
+def benchmark(method, raw_sbox, threads, timeout, cold_cache=True):
+    # One method on one S box in a fresh process and a scratch directory
+    # Returns one record per result file of the method
+    name = raw_sbox["name"]
+    bits = int(raw_sbox["input"])
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as workdir:
+        queue = ctx.Queue()
+        job = ctx.Process(target=run_job, args=(method, raw_sbox, threads, workdir, queue, cold_cache))
+        job.start()
+        job.join(timeout)
+        if job.is_alive():
+            job.terminate()
+            job.join()
+            stats = {"error": f"timeout after {timeout} s"}
+        elif queue.empty():
+            stats = {"error": f"exit code {job.exitcode}"}
+        else:
+            stats = queue.get()
+
+        records = list()
+        for label, (output, baseline) in METHODS[method]["files"](name, bits).items():
+            record = {"method": method + (f"_{label}" if label else ""), "sbox": name, "cache": "cold" if cold_cache else "warm"}
+            record.update(stats)
+            record["count"] = count_inequalities(os.path.join(workdir, output)) if stats["error"] is None else None
+            record["baseline"] = count_inequalities(os.path.join(ROOT, baseline))
+            records.append(record)
+    return records
+
+
+def flag(record, previous, slowdown, min_seconds):
+    # Regressions of a record: more inequalities than the checked-in result, or slower than the previous run
+    flags = list()
+    if record["error"] is not None:
+        flags.append("ERROR")
+        return flags
+    if record["baseline"] is not None and record["count"] is not None and record["count"] > record["baseline"]:
+        flags.append("SIZE")
+    before = previous.get((record["method"], record["sbox"]))
+    # Cold and warm cache times are not comparable
+    if before and before.get("wall") is not None and before.get("cache") == record["cache"]:
+        if record["wall"] > before["wall"] * slowdown and record["wall"] - before["wall"] > min_seconds:
+            flags.append("SLOW")
+    return flags
+
+
+def report(records):
+    print(f"{'method':<16}{'sbox':<14}{'count':>7}{'base':>7}{'wall s':>10}{'solver s':>10}{'RSS MB':>9}  flags")
+    for r in records:
+        count = "-" if r.get("count") is None else r["count"]
+        base = "-" if r.get("baseline") is None else r["baseline"]
+        wall = "-" if r.get("wall") is None else f"{r['wall']:.2f}"
+        solver = "-" if r.get("solver") is None else f"{r['solver']:.2f}"
+        rss = "-" if r.get("peak_rss_mb") is None else f"{r['peak_rss_mb']:.0f}"
+        print(f"{r['method']:<16}{r['sbox']:<14}{count:>7}{base:>7}{wall:>10}{solver:>10}{rss:>9}  {' '.join(r['flags'])}")
+
+
+if __name__ == "__main__":
+
+    # S box catalogue; missing files are skipped
+    catalogue = ['../SBOXES/4_bit_sboxes.json', '../SBOXES/5_bit_sboxes.json']
+
+    # Methods to run, see METHODS
+    methods = ["modified", "iterative", "greedy", "direct"]
+
+    # Every job gets the whole machine and at most this many seconds
+    threads = os.cpu_count()
+    timeout = 3600
+
+    # Every job starts from an empty hull cache (True), so the times include the convex hull step, or uses the
+    # shared .hull_cache/ at the repository root (False), which leaves the hull out once it has been filled
+    cold_cache = True
+
+    # Results of this run; the previous contents of the file are the speed baseline.
+    # A job is flagged SLOW when it takes slowdown times as long as before and at least min_seconds more
+    results_file = "benchmark_results.json"
+    slowdown = 1.25
+    min_seconds = 1.0
+
+    previous = dict()
+    if os.path.exists(results_file):
+        with open(results_file) as f:
+            previous = {(r["method"], r["sbox"]): r for r in json.load(f)["records"]}
+
+    records = list()
+    for path in catalogue:
+        if not os.path.exists(path):
+            print(f"{path}: not found, skipped")
+            continue
+        for raw_sbox in load_sboxes(path):
+            for method in methods:
+                for record in benchmark(method, raw_sbox, threads, timeout, cold_cache):
+                    record["flags"] = flag(record, previous, slowdown, min_seconds)
+                    records.append(record)
+                    report([record])
+
+    print()
+    report(records)
+    regressions = [r for r in records if r["flags"]]
+    print(f"{len(regressions)} of {len(records)} results flagged")
+
+    write_atomic(results_file, [json.dumps({"created": time.strftime("%Y-%m-%d %H:%M:%S"), "records": records}, indent=1)])
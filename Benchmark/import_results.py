@@ -0,0 +1,25 @@
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sbox_modeling.store import ResultStore, import_text_results
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+if __name__ == "__main__":
+
+    # Store to fill, None for the default (results_store/ at the repository root or SBOX_RESULTS_DIR)
+    store_dir = None
+
+    store = ResultStore(store_dir)
+    start = time.time()
+    imported = import_text_results(ROOT, store)
+    for method, count in imported.items():
+        print(f"{method}: {count} inequality systems -> {store.path(method)}")
+    print(f"imported in {time.time() - start:.2f} s")
+
+    # Load time of the whole store, which is what a downstream model pays instead of parsing the text files
+    start = time.time()
+    systems = sum(len(store.load(method).keys) for method in imported)
+    print(f"{systems} systems loaded in {time.time() - start:.4f} s")
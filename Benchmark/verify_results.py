@@ -0,0 +1,72 @@
+import json
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sbox_modeling.batch import load_sboxes, write_atomic
+from sbox_modeling.tables import SboxTransitions
+from sbox_modeling.verify import read_inequalities, verify_many, describe
+from sbox_modeling.store import TEXT_RESULTS, text_result_files
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def verify_tree(sboxes):
+    # Checks every result file of the tree against its S box. The files of one S box that share the
+    # constant position are checked together, with one evaluation of all their inequalities.
+    # Returns one record per file; files whose S box is not in sboxes are recorded as skipped.
+    by_name = {raw["name"].lower(): raw for raw in sboxes}
+    groups = dict()
+    records = list()
+    for directory, method, variants, constant_first in TEXT_RESULTS:
+        for name, suffix, path in text_result_files(ROOT, directory, variants):
+            record = {"file": os.path.relpath(path, ROOT), "sbox": name}
+            if name.lower() not in by_name:
+                record["error"] = "S box not in the catalogue"
+                records.append(record)
+                continue
+            groups.setdefault((name.lower(), constant_first), list()).append(record)
+            records.append(record)
+
+    for (name, constant_first), group in groups.items():
+        sbox = SboxTransitions(by_name[name])
+        models = list()
+        for record in group:
+            try:
+                models.append(read_inequalities(os.path.join(ROOT, record["file"])))
+            except ValueError as error:
+                record["error"] = f"unreadable: {error}"
+                models.append(list())
+        for record, report in zip(group, verify_many(models, sbox, constant_first)):
+            if "error" not in record:
+                record.update(report)
+    return records
+
+
+if __name__ == "__main__":
+
+    # S box catalogue; missing files are skipped
+    catalogue = ['../SBOXES/4_bit_sboxes.json', '../SBOXES/5_bit_sboxes.json']
+
+    # Full reports of every file (uncovered and wrongly cut transitions, redundant inequalities)
+    report_file = "verification.json"
+
+    sboxes = list()
+    for path in catalogue:
+        if os.path.exists(path):
+            sboxes += load_sboxes(path)
+        else:
+            print(f"{path}: not found, skipped")
+
+    start = time.time()
+    records = verify_tree(sboxes)
+    checked = [r for r in records if "valid" in r]
+    invalid = [r for r in checked if not r["valid"]] + [r for r in records if r.get("error", "").startswith("unreadable")]
+    skipped = [r for r in records if "valid" not in r and r not in invalid]
+    for r in records:
+        print(f"{r['file']}: {r['error'] if 'error' in r else describe(r)}")
+    print(f"{len(checked)} of {len(records)} files checked in {time.time() - start:.2f} s, {len(invalid)} invalid, {len(skipped)} skipped")
+
+    write_atomic(report_file, [json.dumps(records, indent=1)])
+    # A skipped file is a failure too: with the catalogue missing nothing would be checked at all
+    sys.exit(1 if invalid or skipped or not checked else 0)
@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sbox_modeling.cipher import stamp_rounds, present_layout, gift64_layout
+from sbox_modeling.store import ResultStore, TEXT_RESULTS, text_result_files, constant_first_matrix
+from sbox_modeling.verify import read_inequalities
+from sbox_modeling.milp import OPTIMAL
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Layout and S box name of every supported cipher
+CIPHERS = {
+    "present": (present_layout, "PRESENT"),
+    "gift64": (gift64_layout, "GIFT"),
+}
+
+
+def load_system(method, sbox_name, table_type="DDT", variant="", store=None):
+    # Inequality system of an S box, constant first: from the binary store, or else from the text results
+    store = ResultStore() if store is None else store
+    system = store.load(method).get(sbox_name, table_type, variant)
+    if system is not None:
+        return system
+    for directory, dir_method, variants, constant_first in TEXT_RESULTS:
+        if dir_method != method or table_type != "DDT":
+            continue
+        for name, suffix, path in text_result_files(ROOT, directory, variants):
+            if name == sbox_name and variants[suffix] == variant:
+                return constant_first_matrix(read_inequalities(path), constant_first)
+    raise KeyError(f"no {table_type} system of {sbox_name} for {method} {variant!r}")
+
+
+if __name__ == "__main__":
+
+    # Cipher and number of rounds
+    cipher = "present"
+    rounds = 40
+
+    # S box model to stamp: method and variant of the stored result (see sbox_modeling/store.py)
+    method = "iterative"
+    variant = ""
+
+    # Model files to write (None: skip)
+    lp_file = f"{cipher}_{rounds}_rounds.lp"
+    mps_file = None
+
+    # Solve the model for the minimum number of active S boxes (only sensible for a few rounds)
+    solve = False
+    backend = "auto"
+    threads = os.cpu_count()
+    time_limit = 3600
+
+    layout, sbox_name = CIPHERS[cipher]
+    system = load_system(method, sbox_name, variant=variant)
+
+    start = time.time()
+    model = stamp_rounds(system, layout(rounds))
+    print(f"{cipher}, {rounds} rounds: {model.num_vars} variables, {model.num_rows} rows from {len(system)} inequalities per S box, built in {time.time() - start:.3f} s")
+
+    if lp_file:
+        model.write_lp(lp_file)
+    if mps_file:
+        model.write_mps(mps_file)
+
+    if solve:
+        M = model.to_model(backend, threads, time_limit)
+        M.optimize()
+        if M.has_solution:
+            print(f"active S boxes: {round(M.objective)}" + ("" if M.status == OPTIMAL else f" (lower bound {M.bound:.1f})"))
+        M.dispose()
@@ -1,124 +1,291 @@
 import numpy as np
-import json
 import time
-import gurobipy as gp
-from gurobipy import GRB
 from math import gcd
-from functools import reduce
+from functools import reduce, partial
 from itertools import combinations
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sbox_modeling.tables import SboxTransitions, point_matrix
+from sbox_modeling.batch import load_sboxes, run_batch, write_atomic, result_path
+from sbox_modeling.milp import create_model, OPTIMAL
+from sbox_modeling.symmetry import symmetry_group, orbit_cuts
+from sbox_modeling.verify import verify, describe
+from sbox_modeling.store import ResultStore
+from sbox_modeling.telemetry import phase, set_context, enable, event_file, summarize, write_chrome_trace
+from sbox_modeling.portfolio import run_portfolio
 
-def get_sbox(raw_sbox):
-    # Name of the S box
-    name = raw_sbox["name"]
+def build_model(P, B, n, a_bound, b_bound, threads=None, backend="auto", time_limit=None, params=None, verbose=True):
+    # P is the 0/1 matrix of the possible transitions (see possible_matrix), computed once per S box.
+    # B is a sorted array of impossible transitions; the y-variables are returned as a column array
+    # in the same order, so solutions map back to points by position
+    # Create Model
+    M = create_model(backend, threads, time_limit, verbose, params=params)
 
-    # Input and output size of the S box
-    input_bit_size = int(raw_sbox["input"])
-    output_bit_size = int(raw_sbox["output"]) 
-
-    # S box in the form of an integer array
-    s_box = [0]*(2**input_bit_size)
-    for i in raw_sbox["s-box"]:
-        s_box[int(i)] = int(raw_sbox["s-box"][i])
-    return name, input_bit_size, output_bit_size, s_box
-
-def gen_DDT(input_bit_size, output_bit_size, s_box):
-    # Generate DDT from the obtained S box
-    DDT = np.zeros((2**input_bit_size,2**output_bit_size), dtype=int)
-    for p1 in range(2**input_bit_size):
-        for p2 in range(2**output_bit_size):
-            XOR_IN = p1 ^ p2
-            XOR_OUT = s_box[p1] ^ s_box[p2]
-            DDT[XOR_IN][XOR_OUT] += 1
-    return DDT
-
-def get_transitions(input_bit_size, output_bit_size, DDT):
-    # Get possible and impossible transitions from the DDT
-    possible_transitions = set()
-    impossible_transitions = set()    
-    for i in range(2**input_bit_size):
-        for j in range(2**output_bit_size):
-            x = bin(i)[2:].zfill(input_bit_size)
-            y = bin(j)[2:].zfill(output_bit_size)
-            point = int(x + y, 2)
-            if DDT[i][j] > 0:
-                possible_transitions.add(point)
-            else:
-                impossible_transitions.add(point)
-    return possible_transitions,impossible_transitions
+    # Variables
+    a_vars = M.add_vars(n, lb=-a_bound, ub=a_bound, name="a")
+    b = M.add_vars(1, lb=0, ub=b_bound, name="b")[0]
+    y_cols = M.add_vars(len(B), lb=0, ub=1, name="y")
 
+    # Constraints, one bulk call per family built from the 0/1 point matrices:
+    #   a.v + b >= 0 for every possible v, a.v + b + big_M*y_v <= big_M - 1 for every impossible v
+    cols = np.append(a_vars, b)
+    big_M = n*a_bound + b_bound + 1
+    M.add_constrs(cols, np.column_stack([P, np.ones(len(P))]), lb=0, name="constraint_1")
+    Q = point_matrix(B, n)
+    M.add_constrs(np.column_stack([np.tile(cols, (len(B), 1)), y_cols]), np.column_stack([Q, np.ones(len(B)), np.full(len(B), big_M)]), ub=big_M-1, name="constraint_2")
 
-def gen_function(possible_transitions, impossible_transitions, n, sbox_name, a_bound, b_bound):
-    B = set(impossible_transitions)
-    p = ''
-    Final_inequalities = list()
-    while B:
-        # Create Model
-        M = gp.Model()
+    # Objective
+    M.set_objective(y_cols, 1, maximize=True)
+    return M, cols, y_cols
+
+def orbit_removals(q, group, B, n, min_removed=1):
+    # Images of q under the symmetry group that remove at least min_removed points of the array B not removed
+    # by an earlier image, each with the mask of those points. The caller passes the number of points the MILP
+    # solution itself removed, so an image is only added to the model when it does as much as a solve would
+    if not group or len(B) == 0:
+        return list()
+    images, cuts = orbit_cuts(q, group, point_matrix(B, n), constant_first=False)
+    left = np.ones(len(B), dtype=bool)
+    removals = list()
+    for image, cut in zip(images, cuts):
+        hit = cut & left
+        if hit.any() and hit.sum() >= min_removed:
+            removals.append((list(image), hit))
+            left &= ~hit
+    return removals
 
-        # Variables
-        a_vars = M.addVars(n, vtype=GRB.INTEGER, lb=-a_bound, ub=a_bound, name="a")
-        b = M.addVar(vtype=GRB.INTEGER, lb=0, ub=b_bound, name="b")
-        y_vars = M.addVars(B, vtype=GRB.BINARY, name="y")
-        # z_vars = M.addVars(border, vtype=GRB.BINARY, name="z")
+def possible_matrix(possible_transitions, n):
+    return point_matrix(np.array(sorted(possible_transitions), dtype=np.int64), n)
 
-        # Constraints
-        for v in possible_transitions:
-            bin_v = format(v, f'0{n}b')
-            f_v = sum(a_vars[i] * int(bin_v[i]) for i in range(n)) + b
-            M.addConstr(f_v >= 0, name=f"constraint_1_{v}")
-        for v in B:
-            bin_v = format(v, f'0{n}b')
-            f_v = sum(a_vars[i] * int(bin_v[i]) for i in range(n)) + b
-            M.addConstr(f_v - ((n*a_bound + b_bound + 1)*(1-y_vars[v])) <= -1, name=f"constraint_2_{v}")
 
+def stuck_round(M, removed, remaining, a_bound, b_bound):
+    # A round that does not end optimal, or whose inequality removes no point, leaves the model unable to
+    # remove every impossible transition: no later round can do better with the same bounds
+    status = M.status
+    if status != OPTIMAL:
+        M.dispose()
+        raise RuntimeError(f"MILP round ended with status {status}, {remaining} impossible transitions left")
+    if not removed.any():
+        M.dispose()
+        raise ValueError(f"no inequality with coefficients within {a_bound} and constant within {b_bound} removes any of the {remaining} impossible transitions left")
 
 
-        # Objective
-        M.setObjective(sum(y_vars[v] for v in B), GRB.MAXIMIZE)
+def gen_function(possible_transitions, impossible_transitions, n, sbox_name, a_bound, b_bound, persistent=False, threads=None, backend="auto", group=None, race=None, params=None, verbose=True):
+    # With group (see symmetry_group) every inequality found is expanded into its orbit.
+    # With race (a portfolio Race) the run gives up and returns None as soon as it can no longer end
+    # with fewer inequalities than the best configuration so far, or runs out of time.
+    # Raises when the bounds allow no inequality removing the impossible transitions left (see stuck_round)
+    if persistent:
+        return gen_function_persistent(possible_transitions, impossible_transitions, n, sbox_name, a_bound, b_bound, threads, backend, group, race, params, verbose)
+    B = np.array(sorted(impossible_transitions), dtype=np.int64)
+    P = possible_matrix(possible_transitions, n)
+    p = ''
+    Final_inequalities = list()
+    while len(B):
+        if race is not None and not race.can_win(len(Final_inequalities)):
+            return None
+        M, cols, y_cols = build_model(P, B, n, a_bound, b_bound, threads, backend, None if race is None else race.remaining(), params, verbose)
 
         # Optimize
         M.optimize()
+        if race is not None and M.status != OPTIMAL:
+            M.dispose()
+            return None
 
-        Result = [int(a_vars[i].X) for i in range(n)] + [int(b.X)]
+        solved = np.round(M.values(y_cols)) == 1 if M.has_solution else np.zeros(len(B), dtype=bool)
+        stuck_round(M, solved, len(B), a_bound, b_bound)
+        Result = [int(round(x)) for x in M.values(cols)]
         Final_inequalities.append(Result)
-        if M.status == GRB.OPTIMAL:
-            for v in list(B):
-                if int(y_vars[v].X) == 1:
-                    B.discard(v)
+        B = B[~solved]
+        keep = np.ones(len(B), dtype=bool)
+        for image, removed in orbit_removals(Result, group, B, n, solved.sum()):
+            Final_inequalities.append(image)
+            keep &= ~removed
+        B = B[keep]
 
         # Dispose
         M.dispose()
 
     return Final_inequalities
 
+
+def gen_function_persistent(possible_transitions, impossible_transitions, n, sbox_name, a_bound, b_bound, threads=None, backend="auto", group=None, race=None, params=None, verbose=True):
+    # Same rounds as gen_function, but the model is built once and kept alive:
+    # removed points get their y-variable fixed to 0 and the next round starts from the previous solution
+    B = np.array(sorted(impossible_transitions), dtype=np.int64)
+    alive = np.ones(len(B), dtype=bool)
+    Final_inequalities = list()
+
+    M, cols, y_cols = build_model(possible_matrix(possible_transitions, n), B, n, a_bound, b_bound, threads, backend, params=params, verbose=verbose)
+
+    while alive.any():
+        if race is not None:
+            if not race.can_win(len(Final_inequalities)):
+                M.dispose()
+                return None
+            M.set_time_limit(race.remaining())
+
+        # Optimize
+        M.optimize()
+        if race is not None and M.status != OPTIMAL:
+            M.dispose()
+            return None
+
+        # Switch off the points removed in this round; their big-M rows become slack
+        removed = alive & (np.round(M.values(y_cols)) == 1) if M.has_solution else np.zeros(len(B), dtype=bool)
+        stuck_round(M, removed, alive.sum(), a_bound, b_bound)
+        Result = [int(round(x)) for x in M.values(cols)]
+        Final_inequalities.append(Result)
+        alive &= ~removed
+        left = np.flatnonzero(alive)
+        for image, image_removed in orbit_removals(Result, group, B[left], n, removed.sum()):
+            Final_inequalities.append(image)
+            removed[left[image_removed]] = True
+        alive &= ~removed
+        M.set_bounds(y_cols[removed], 0, 0)
+
+        # Warm start: the previous inequality with every y at 0 is feasible for the next round
+        M.set_start(cols, Result)
+        M.set_start(y_cols, 0)
+
+    # Dispose
+    M.dispose()
+
+    return Final_inequalities
+
+def run_sbox(raw_sbox, threads, a_bound, b_bound, persistent, backend="auto", use_symmetry=False, table_type="DDT", store=None):
+    # Load S box from data, generate its table (DDT by default) and get the possible and impossible transitions
+    set_context(sbox=raw_sbox["name"], method="direct")
+    sbox = SboxTransitions(raw_sbox, table_type)
+    name = sbox.name
+    possible_transitions = set(sbox.possible.tolist())
+    impossible_transitions = set(sbox.impossible.tolist())
+
+    # Intialize variables for this method
+    n = sbox.n
+
+    # Bit permutation / XOR translation symmetries of the possible transitions
+    with phase("symmetry_group") as info:
+        group = symmetry_group(sbox.possible_points) if use_symmetry else None
+        info.update(size=len(group) if group else 1)
+
+    # Final Inequalities
+    with phase("gen_function", a_bound=a_bound, b_bound=b_bound, persistent=persistent) as info:
+        Final_inequalities = gen_function(possible_transitions, impossible_transitions, n, name, a_bound, b_bound, persistent, threads, backend, group)
+        info.update(inequalities=len(Final_inequalities))
+
+    # The MILP outputs put the constant last; an invalid model is reported and never written
+    report = verify(Final_inequalities, sbox, constant_first=False)
+    if not report["valid"]:
+        raise ValueError(f"{name}: {describe(report)}")
+
+    save_result(name, Final_inequalities, a_bound, b_bound, table_type, store)
+    return len(Final_inequalities)
+
+
+def save_result(name, Final_inequalities, a_bound, b_bound, table_type="DDT", store=None):
+    write_atomic(result_path(f"{name}_{a_bound}_{b_bound}.txt", table_type), [str(list(q)) for q in Final_inequalities])
+    if store is not None:
+        store.put("direct", name, Final_inequalities, table_type, f"{a_bound}_{b_bound}", constant_first=False)
+
+
+def race_configuration(configuration, threads, race, raw_sbox, backend="auto", table_type="DDT"):
+    # One portfolio configuration of one S box, in its own process (see run_portfolio_sbox).
+    # Returns the inequalities, or None when the race stopped it
+    set_context(sbox=raw_sbox["name"], method="direct")
+    sbox = SboxTransitions(raw_sbox, table_type)
+    group = symmetry_group(sbox.possible_points) if configuration["use_symmetry"] else None
+    with phase("gen_function", a_bound=configuration["a_bound"], b_bound=configuration["b_bound"], persistent=configuration["persistent"]) as info:
+        Final_inequalities = gen_function(set(sbox.possible.tolist()), set(sbox.impossible.tolist()), sbox.n, sbox.name,
+                                          configuration["a_bound"], configuration["b_bound"], configuration["persistent"], threads,
+                                          backend, group, race, configuration.get("params"), verbose=False)
+        info.update(inequalities=None if Final_inequalities is None else len(Final_inequalities))
+    if Final_inequalities is not None:
+        report = verify(Final_inequalities, sbox, constant_first=False)
+        if not report["valid"]:
+            raise ValueError(describe(report))
+    return Final_inequalities
+
+
+def run_portfolio_sbox(raw_sbox, configurations, total_threads, budget, backend="auto", table_type="DDT", store=None):
+    # Races the configurations (dicts of a_bound, b_bound, persistent, use_symmetry and optional solver params)
+    # on one S box at once, each on its own share of the threads, for at most budget seconds.
+    # The smallest model found is written like a single run with its bounds; returns its size, None when no
+    # configuration finished in time
+    name = raw_sbox["name"]
+    worker = partial(race_configuration, raw_sbox=raw_sbox, backend=backend, table_type=table_type)
+    best, records = run_portfolio(worker, configurations, total_threads, budget)
+    for configuration, record in zip(configurations, records):
+        size = "-" if record["model"] is None else len(record["model"])
+        seconds = "-" if record["seconds"] is None else f"{record['seconds']:.1f} s"
+        print(f"{name}: {configuration} {record['status']} {size} {seconds}" + (f" {record['error']}" if record["error"] else ""))
+    if best is None:
+        return None
+    configuration = configurations[best]
+    save_result(name, records[best]["model"], configuration["a_bound"], configuration["b_bound"], table_type, store)
+    return len(records[best]["model"])
+
+
 if __name__ == "__main__":
 
-    f = open('lblock_s0_sbox.json')
     # Take S boxes from file input
-    data = json.load(f)
-    f.close()
+    data = load_sboxes('lblock_s0_sbox.json')
+
+    # Select the bounds
+    a_bound = 500
+    b_bound = 500
+
+    # Keep one model alive across rounds instead of rebuilding it
+    persistent = True
 
-    for val in data:
-        # Load S box from data
-        name, input_bit_size, output_bit_size, s_box = get_sbox(val)
+    # MILP solver: "gurobi", "highs" or "auto" (Gurobi when installed, HiGHS otherwise)
+    backend = "auto"
 
-        # Generate DDT
-        DDT = gen_DDT(input_bit_size, output_bit_size, s_box)
+    # Expand every inequality found into its orbit under the S box's symmetries
+    use_symmetry = False
 
-        # Get the possible and impossible transitions
-        possible_transitions, impossible_transitions = get_transitions(input_bit_size, output_bit_size, DDT) 
+    # Table the transitions come from: "DDT", "LAT", "BCT" (permutations only) or "DPT"; models of
+    # tables other than the DDT are written below a directory named after the table
+    table_type = "DDT"
 
-        # Intialize variables for this method
-        n = input_bit_size+output_bit_size
+    # Binary store the results are also added to (see sbox_modeling/store.py), None to write the text files only
+    store = ResultStore()
 
-        # Select the bounds
-        a_bound = 500
-        b_bound = 500
+    # Per-phase timings, candidate counts and solver statistics as JSON lines (None: off), and the Chrome trace made from them
+    telemetry_file = None
+    trace_file = "trace.json"
+    enable(telemetry_file)
+
+    # Threads shared between the S boxes solved in parallel and the solver inside each of them
+    total_threads = os.cpu_count()
+
+    # Portfolio mode: race these configurations on every S box, one process each, and keep the smallest model
+    # found within portfolio_budget seconds. Keys not given take the settings above; "params" are solver
+    # parameters, so their names depend on the backend. A configuration stops as soon as it can no longer
+    # beat the best one finished. The S boxes are then solved one after the other.
+    use_portfolio = False
+    portfolio = [dict(a_bound=256, b_bound=256), dict(a_bound=500, b_bound=500),
+                 dict(a_bound=500, b_bound=500, persistent=not persistent), dict(a_bound=1000, b_bound=1000)]
+    portfolio_budget = 600
+
+    if use_portfolio:
+        defaults = dict(a_bound=a_bound, b_bound=b_bound, persistent=persistent, use_symmetry=use_symmetry)
+        configurations = [dict(defaults, **c) for c in portfolio]
+        for raw_sbox in data:
+            count = run_portfolio_sbox(raw_sbox, configurations, total_threads, portfolio_budget, backend, table_type, store)
+            if count is None:
+                print(f"{raw_sbox['name']}: no configuration finished within {portfolio_budget} s")
+            else:
+                print(f"{raw_sbox['name']}: {count} inequalities")
+    else:
+        worker = partial(run_sbox, a_bound=a_bound, b_bound=b_bound, persistent=persistent, backend=backend, use_symmetry=use_symmetry, table_type=table_type, store=store)
+        for name, count, error in run_batch(worker, data, total_threads):
+            if error is not None:
+                print(f"{name}: failed with {error!r}")
+            else:
+                print(f"{name}: {count} inequalities")
 
-        # Final Inequalities
-        Final_inequalities = gen_function(possible_transitions, impossible_transitions, n, name, a_bound, b_bound)
-        
-        file1 = open(f"{name}_{a_bound}_{b_bound}.txt", "a")
-        for q in Final_inequalities:
-            file1.write(f"{str(list(q))}\n")
-        file1.close()
+    if event_file():
+        summarize(event_file())
+        write_chrome_trace(event_file(), trace_file)
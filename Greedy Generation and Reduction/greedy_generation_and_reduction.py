@@ -1,113 +1,123 @@
 import numpy as np
-import json
 import time
-import gurobipy as gp
-from gurobipy import GRB
-
-def get_sbox(raw_sbox):
-    # Name of the S box
-    name = raw_sbox["name"]
-
-    # Input and output size of the S box
-    input_bit_size = int(raw_sbox["input"])
-    output_bit_size = int(raw_sbox["output"]) 
-
-    # S box in the form of an integer array
-    s_box = [0]*(2**input_bit_size)
-    for i in raw_sbox["s-box"]:
-        s_box[int(i)] = int(raw_sbox["s-box"][i])
-    return name, input_bit_size, output_bit_size, s_box
-
-def gen_DDT(input_bit_size, output_bit_size, s_box):
-    # Generate DDT from the obtained S box
-    DDT = np.zeros((2**input_bit_size,2**output_bit_size), dtype=int)
-    for p1 in range(2**input_bit_size):
-        for p2 in range(2**output_bit_size):
-            XOR_IN = p1 ^ p2
-            XOR_OUT = s_box[p1] ^ s_box[p2]
-            DDT[XOR_IN][XOR_OUT] += 1
-    return DDT
-
-def get_transitions(input_bit_size, output_bit_size, DDT):
-    # Get possible and impossible transitions from the DDT
-    possible_transitions = set()
-    impossible_transitions = set()    
-    for i in range(2**input_bit_size):
-        for j in range(2**output_bit_size):
-            x = bin(i)[2:].zfill(input_bit_size)
-            y = bin(j)[2:].zfill(output_bit_size)
-            point = int(x + y, 2)
-            if DDT[i][j] > 0:
-                possible_transitions.add(point)
-            else:
-                impossible_transitions.add(point)
-    return possible_transitions,impossible_transitions
-
-
-def gen_functions(possible_transitions, impossible_transitions, n, sbox_name):
+from functools import partial
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sbox_modeling.tables import SboxTransitions, point_matrix
+from sbox_modeling.kernel import cut_matrix
+from sbox_modeling.batch import load_sboxes, run_batch, write_atomic, result_path
+from sbox_modeling.candidate_log import CandidateLog
+from sbox_modeling.milp import create_model, OPTIMAL, INFEASIBLE, INF
+from sbox_modeling.cover import min_cover
+from sbox_modeling.symmetry import symmetry_group, orbit, orbit_cuts
+from sbox_modeling.verify import verify, describe
+from sbox_modeling.store import ResultStore
+from sbox_modeling.telemetry import phase, set_context, enable, event_file, summarize, write_chrome_trace
+
+# How gen_functions enumerates the cut sets: one solve per round, or a single solve with lazy no-good cuts
+ENGINES = ("sequential", "lazy")
+
+# Candidates written to the log between two fsyncs. Every candidate reaches the OS at once, so only a crash of
+# the machine can lose the last ones, and resume then finds them again
+LOG_SYNC_EVERY = 8
+
+def gen_functions(possible_transitions, impossible_transitions, n, sbox_name, threads=None, checkpoint_every=None, resume=False, backend="auto", group=None, engine="sequential"):
+    # Every candidate goes to the append-only log {sbox_name}_All_Candid_ineqs.jsonl as soon as it is found
+    # (synced to disk every LOG_SYNC_EVERY candidates).
+    # The model is written to Model_{sbox_name}.lp only every checkpoint_every rounds (never when None).
+    # With resume=True the candidates of an interrupted run are read back from the log and their
+    # cuts re-added, so the search continues where it stopped.
+    # With group (see symmetry_group) the other images of every inequality found are added as candidates
+    # together with their cuts, so the MILP does not have to find them one by one.
+    # engine="lazy" runs one branch and bound instead of one solve per round, see gen_functions_lazy.
+    if engine not in ENGINES:
+        raise ValueError(f"unknown engine {engine!r}, expected one of {ENGINES}")
     all_ineqs = list()
-    B = set(impossible_transitions)
-    removed_set = set()
+    # Impossible transitions as a sorted array; y-variables, bit vectors and removed sets (bool masks) follow its order
+    B = np.array(sorted(impossible_transitions), dtype=np.int64)
+    removed_set = np.zeros(len(B), dtype=bool)
 
     # Create Model
-    M = gp.Model()
+    M = create_model(backend, threads)
 
     a_bound = n
     b_bound = 2**(n/2)
 
     # Variables
-    a_vars = M.addVars(n, vtype=GRB.INTEGER, lb=-a_bound , ub=a_bound, name="a")
-    b = M.addVar(vtype=GRB.INTEGER, lb=0, ub=b_bound , name="b")
-    y_vars = M.addVars(B, vtype=GRB.BINARY, name="y")
+    a_vars = M.add_vars(n, lb=-a_bound , ub=a_bound, name="a")
+    b = M.add_vars(1, lb=0, ub=b_bound , name="b")[0]
+    y_cols = M.add_vars(len(B), lb=0, ub=1, name="y")
 
-    # Constraints
-    for v in possible_transitions:
-        bin_v = format(v, f'0{n}b')
-        f_v = sum(a_vars[i] * int(bin_v[i]) for i in range(n)) + b
-        M.addConstr(f_v >= 0, name=f"constraint_1_{v}")
+    # Constraints, one bulk call per family built from the 0/1 point matrices
+    cols = np.append(a_vars, b)
+    big_M = (n*a_bound)+ b_bound + 1
+    possible = np.array(sorted(possible_transitions), dtype=np.int64)
+    P = point_matrix(possible, n)
+    M.add_constrs(cols, np.column_stack([P, np.ones(len(P))]), lb=0, name="constraint_1")
 
-    for v in B:
-        bin_v = format(v, f'0{n}b')
-        f_v = sum(a_vars[i] * int(bin_v[i]) for i in range(n)) + b
-        M.addConstr(f_v - (((n*a_bound)+ b_bound + 1)*(1-y_vars[v])) <= -1, name=f"constraint_2_{v}")
+    B_points = point_matrix(B, n)
+    M.add_constrs(np.column_stack([np.tile(cols, (len(B), 1)), y_cols]), np.column_stack([B_points, np.ones(len(B)), np.full(len(B), big_M)]), ub=big_M-1, name="constraint_2")
 
     # Objective
-    M.setObjective(sum(y_vars[v] for v in B), GRB.MAXIMIZE)
+    M.set_objective(y_cols, 1, maximize=True)
     count = 0
-    
-    while True :
+
+    # Removed sets found so far, keyed by their packed mask
+    seen = set()
+
+    log = CandidateLog(f"{sbox_name}_All_Candid_ineqs.jsonl", resume=resume, sync_every=LOG_SYNC_EVERY)
+    for record in log.records:
+        N = np.isin(B, record["removed"])
+        all_ineqs.append(record["ineq"])
+        removed_set |= N
+        seen.add(np.packbits(N).tobytes())
+        count += 1
+        add_no_good(M, y_cols, N, count)
+
+    if engine == "lazy":
+        all_ineqs += gen_functions_lazy(M, cols, y_cols, B, B_points, group, seen, log, count)
+
+    while engine == "sequential" :
     # while len(removed_set) != len(impossible_transitions):
-        N = set()
-        s = ''
-        
+        N = np.zeros(len(B), dtype=bool)
+
         # Optimize
         M.optimize()
-        if M.status == GRB.INFEASIBLE :
+        if M.status == INFEASIBLE :
             break
 
-        q = [int(a_vars[i].X) for i in range(n)] + [int(b.X)]
+        q = [int(round(x)) for x in M.values(cols)]
         all_ineqs.append(q)
         count += 1
 
-        # to_remove = []
-        if M.status == GRB.OPTIMAL:
-            for v in list(B):
-                if int(y_vars[v].X) == 1:
-                    s = s + str(v) + " "
-                    N.add(v)
-                    removed_set.add(v)
+        if M.status == OPTIMAL:
+            N = np.round(M.values(y_cols)) == 1
+            removed_set |= N
+
+        add_no_good(M, y_cols, N, count)
+        seen.add(np.packbits(N).tobytes())
 
-        M.addConstr(sum(y_vars[v] for v in N) <= (len(N)-1), name=f"constraint_3_{count}")
-        M.addConstr(sum(y_vars[v] for v in (B - N)) >= 1, name=f"constraint_4_{count}")
+        log.append({"round": count, "ineq": q, "removed": B[N].tolist()})
 
-        f = open(f"{sbox_name}_All_Candid_ineqs.txt","a")
-        f.write(str(q))
-        f.write(f"--- {len(N)} points removed --- ")
-        f.write(s+"\n")
-        f.close()
+        # Orbit of q: every image with a cut set not seen yet is a new candidate
+        if group and M.status == OPTIMAL:
+            images, cuts = orbit_cuts(q, group, B_points, constant_first=False)
+            for image, N_image in zip(images, cuts):
+                key = np.packbits(N_image).tobytes()
+                if not N_image.any() or key in seen:
+                    continue
+                seen.add(key)
+                all_ineqs.append(list(image))
+                removed_set |= N_image
+                count += 1
+                add_no_good(M, y_cols, N_image, count)
+                log.append({"round": count, "ineq": list(image), "removed": B[N_image].tolist()})
 
-        M.write(f"Model_{sbox_name}.lp")
+        if checkpoint_every and count % checkpoint_every == 0:
+            M.write(f"Model_{sbox_name}.lp")
 
+    log.close()
 
     # Dispose
     M.dispose()
@@ -115,111 +125,170 @@ def gen_functions(possible_transitions, impossible_transitions, n, sbox_name):
     return all_ineqs
 
 
-def preprocess(all_ineqs, impossible_transitions, n):
-    imp_trans_dict = {v: list() for v in impossible_transitions}
-    for v in impossible_transitions:
-        for i in range(len(all_ineqs)):
-            bin_v = format(v, f'0{n}b')
-            val = sum(all_ineqs[i][j] * int(bin_v[j]) for j in range(n)) + all_ineqs[i][n]
-            if val<0:
-                imp_trans_dict[v].append(i)
-    return imp_trans_dict
-
+def gen_functions_lazy(M, cols, y_cols, B, B_points, group, seen, log, count):
+    # Every solution of the branch and bound is written to the log as soon as it is found and cut off by a
+    # lazy row asking for a point outside the whole cut set of its inequality. Only subsets of that set are
+    # excluded, so a larger cut set found later in the same search is still allowed.
+    found = list()
+
+    def on_solution(values):
+        nonlocal count
+        q = [int(round(x)) for x in values]
+        ineqs = [q] + ([list(image) for image in orbit(q, group, constant_first=False)[1:]] if group else [])
+        cuts = cut_matrix(ineqs, B_points, constant_first=False).to_bool()
+        # The current solution is always cut off, even when its cut set is empty or already known: a solution
+        # returned without a row becomes the incumbent, and the branch and bound would prune every node
+        # that cannot beat it, ending the enumeration early
+        rows = [(y_cols[~cuts[0]], 1, 1, INF)]
+        for ineq, N in zip(ineqs, cuts):
+            key = np.packbits(N).tobytes()
+            if not N.any() or key in seen:
+                continue
+            seen.add(key)
+            found.append(ineq)
+            count += 1
+            log.append({"round": count, "ineq": ineq, "removed": B[N].tolist()})
+            if ineq is not q:
+                rows.append((y_cols[~N], 1, 1, INF))
+        return rows
+
+    M.enumerate_solutions(cols, on_solution)
+    return found
+
+
+def add_no_good(M, y_cols, N, count):
+    # Forbid the removed set N (a mask over the impossible transitions) from being found again,
+    # and ask for at least one point outside it
+    M.add_constr(y_cols[N], 1, ub=(N.sum()-1), name=f"constraint_3_{count}")
+    M.add_constr(y_cols[~N], 1, lb=1, name=f"constraint_4_{count}")
+
+
+def preprocess(all_ineqs, impossible_points):
+    # Cover relation between the inequalities and the impossible transitions (0/1 points), as the packed
+    # cut matrix the cover works on
+    return cut_matrix(all_ineqs, impossible_points, constant_first=False)
+
+
+def pick_best_ineqs(P, cuts, threads=None, backend="auto", cover_method="exact", time_limit=None):
+    # Fewest inequalities of P removing every impossible transition, from their cut matrix (see preprocess)
+    P_list = list(P)
+    if not cuts.covered().all():
+        print("No solution found")
+        return list()
 
-def pick_best_ineqs(P, D, n):
+    # Presolve, heuristic cover and, for the exact method, the MILP started from it
+    cover, lower_bound = min_cover(cuts, cover_method, backend, threads, time_limit)
 
-    P_list = list(P)
-    m = int(len(P))
+    # Final Inequalities
+    final_ineqs_list = [P_list[i] for i in cover]
+    if len(final_ineqs_list) > lower_bound:
+        print(f"Cover of {len(final_ineqs_list)} inequalities, lower bound {lower_bound}")
 
-    # Create Model
-    M = gp.Model()
+    return final_ineqs_list
 
-    # Variables
-    d_vars = M.addVars(m, vtype=GRB.BINARY, name="d")
-
-    # Constraints
-    for v in D:
-        curr_i = set()
-        for i in range(m):
-            bin_v = format(v, f'0{n}b')
-            f_v = sum(P_list[i][j] * int(bin_v[j]) for j in range(n)) + P_list[i][n]
-            if f_v < 0:
-                curr_i.add(i)
-        M.addConstr(gp.quicksum(d_vars[i] for i in curr_i) >= 1)
 
-    # Objective
-    M.setObjective(gp.quicksum(d_vars[i] for i in range(m)), GRB.MINIMIZE)
+def run_sbox(raw_sbox, threads, checkpoint_every=None, resume=False, backend="auto", cover_method="exact", cover_time_limit=None, use_symmetry=False, engine="sequential", table_type="DDT", store=None):
+    s = "$"
+    for ch in raw_sbox["name"]:
+        if ch == '_':
+            s += "\\_"
+        else:
+            s += ch.upper()
+    s +="$"
+    # Load S box from data, generate its table (DDT by default) and get the possible and impossible transitions
+    set_context(sbox=raw_sbox["name"], method="greedy")
+    sbox = SboxTransitions(raw_sbox, table_type)
+    name = sbox.name
+    possible_transitions = set(sbox.possible.tolist())
+    impossible_transitions = set(sbox.impossible.tolist())
+
+    # Intialize variables for this method
+    n = sbox.n
+
+    start_time = time.time()
+    # Bit permutation / XOR translation symmetries of the possible transitions
+    with phase("symmetry_group") as info:
+        group = symmetry_group(sbox.possible_points) if use_symmetry else None
+        info.update(size=len(group) if group else 1)
 
-    # Optimize
-    M.optimize()
+    # Final Inequalities
+    with phase("gen_functions", engine=engine) as info:
+        # Candidate logs and checkpoints of different tables must not be mixed up on resume
+        log_name = name if table_type == "DDT" else f"{name}_{table_type}"
+        all_ineqs = gen_functions(possible_transitions, impossible_transitions, n, log_name, threads, checkpoint_every, resume, backend, group, engine)
+        info.update(candidates=len(all_ineqs))
+    with phase("preprocess"):
+        cuts = preprocess(all_ineqs, sbox.impossible_points)
 
     # Final Inequalities
-    final_ineqs_list = list()
-    if M.status == GRB.OPTIMAL:
-        for i in range(m):
-            if int(d_vars[i].x) == 1:
-                final_ineqs_list.append(P_list[i])
-    else:
-        print("No solution found")
+    with phase("set_cover", cover_method=cover_method) as info:
+        Final_inequalities = pick_best_ineqs(all_ineqs, cuts, threads, backend, cover_method, cover_time_limit)
+        info.update(inequalities=len(Final_inequalities))
+    end_time = time.time()
+
+    # The MILP outputs put the constant last
+    report = verify(Final_inequalities, sbox, constant_first=False)
+    if not report["valid"]:
+        print(f"{name}: {describe(report)}")
+
+    s = s + " & " + str(len(impossible_transitions)) + " & " + str(len(possible_transitions))
+    s += " & " + str(len(Final_inequalities))
+    s += " & " + str("{:.3f}".format(end_time - start_time))
+    s += "\\\\"
+
+    write_atomic(result_path(f"{name}.txt", table_type), [str(q) for q in Final_inequalities])
+    if store is not None:
+        store.put("greedy", name, Final_inequalities, table_type, constant_first=False)
+    return s
 
-    # Dispose
-    M.dispose()
-    
-    return final_ineqs_list
 
 if __name__ == "__main__":
 
-    f = open('../SBOXES/4_bit_sboxes.json')
     # Take S boxes from file input
-    data = json.load(f)
-    f.close()
-
-    for val in data:
-        s = "$"
-        for ch in val["name"]:
-            if ch == '_':
-                s += "\\_"
-            else:
-                s += ch.upper()
-        s +="$"
-        # Load S box from data
-        name, input_bit_size, output_bit_size, s_box = get_sbox(val)
-
-        # Generate DDT
-        DDT = gen_DDT(input_bit_size, output_bit_size, s_box)
-
-        # Get the possible and impossible transitions
-        possible_transitions, impossible_transitions = get_transitions(input_bit_size, output_bit_size, DDT) 
-
-        # Intialize variables for this method
-        n = input_bit_size+output_bit_size
-
-        start_time = time.time()
-        # Final Inequalities
-        all_ineqs = gen_functions(possible_transitions, impossible_transitions, n, name)
-        all_ineqs_list = list(all_ineqs)
-        N = int(len(all_ineqs_list))
-        imp_trans_dict = preprocess(all_ineqs_list, impossible_transitions, n)
-
-        imp_trans_funs_list = []
-        for v in impossible_transitions:
-            imp_trans_funs_list.append(imp_trans_dict[v])
-
-        # Final Inequalities
-        Final_inequalities = pick_best_ineqs(all_ineqs, impossible_transitions, n)
-        end_time = time.time()
-
-        s = s + " & " + str(len(impossible_transitions)) + " & " + str(len(possible_transitions))
-        s += " & " + str(len(Final_inequalities))
-        s += " & " + str("{:.3f}".format(end_time - start_time))
-        s += "\\\\"
-        # print(s)
+    data = load_sboxes('../SBOXES/4_bit_sboxes.json')
+
+    # Threads shared between the S boxes solved in parallel and the solver inside each of them
+    total_threads = os.cpu_count()
+
+    # Write the growing model every this many rounds (None: never), and continue interrupted runs from their candidate logs
+    checkpoint_every = 50
+    resume = True
+
+    # MILP solver: "gurobi", "highs" or "auto" (Gurobi when installed, HiGHS otherwise)
+    backend = "auto"
+
+    # Final cover: "exact" (MILP started from the heuristic cover) or "heuristic" (no MILP), optionally under a time limit in seconds
+    cover_method = "exact"
+    cover_time_limit = None
+
+    # Add the orbit of every inequality found under the S box's symmetries
+    use_symmetry = False
+
+    # Candidate enumeration: "sequential" (one solve per round) or "lazy" (one solve with lazy cuts, Gurobi)
+    engine = "sequential"
+
+    # Table the transitions come from: "DDT", "LAT", "BCT" (permutations only) or "DPT"; models of
+    # tables other than the DDT are written below a directory named after the table
+    table_type = "DDT"
+
+    # Binary store the results are also added to (see sbox_modeling/store.py), None to write the text files only
+    store = ResultStore()
+
+    # Per-phase timings, candidate counts and solver statistics as JSON lines (None: off), and the Chrome trace made from them
+    telemetry_file = None
+    trace_file = "trace.json"
+    enable(telemetry_file)
+
+    worker = partial(run_sbox, checkpoint_every=checkpoint_every, resume=resume, backend=backend, cover_method=cover_method, cover_time_limit=cover_time_limit, use_symmetry=use_symmetry, engine=engine, table_type=table_type, store=store)
+    for name, s, error in run_batch(worker, data, total_threads):
+        if error is not None:
+            print(f"{name}: failed with {error!r}")
+            continue
+        # Only this process appends to the summary table
         file1 = open("new_4_bit_greedy_gen_and_red.txt", "a")
         file1.write(s+"\n")
         file1.close()
 
-        file2 = open(f"{name}.txt", "a")
-        for q in Final_inequalities:
-            file2.write(str(q)+'\n')
-        file2.close()
-        
+    if event_file():
+        summarize(event_file())
+        write_chrome_trace(event_file(), trace_file)
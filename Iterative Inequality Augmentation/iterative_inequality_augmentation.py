@@ -1,57 +1,33 @@
 import numpy as np
-import json
-import time
-from sage.all import *
 from itertools import combinations
-import gurobipy as gp
-from gurobipy import GRB
-
-def get_sbox(raw_sbox):
-    # Name of the S box
-    name = raw_sbox["name"]
-
-    # Input and output size of the S box
-    input_bit_size = int(raw_sbox["input"])
-    output_bit_size = int(raw_sbox["output"]) 
-
-    # S box in the form of an integer array
-    s_box = [0]*(2**input_bit_size)
-    for i in raw_sbox["s-box"]:
-        s_box[int(i)] = int(raw_sbox["s-box"][i])
-    return name, input_bit_size, output_bit_size, s_box
-
-
-def gen_DDT(input_bit_size, output_bit_size, s_box):
-    # Generate DDT from the obtained S box
-    DDT = np.zeros((2**input_bit_size,2**output_bit_size))
-    DDT = DDT.astype(int)
-    for p1 in range(2**input_bit_size):
-        for p2 in range(2**output_bit_size):
-            XOR_IN = p1 ^ p2
-            XOR_OUT = s_box[p1] ^ s_box[p2]
-            DDT[XOR_IN][XOR_OUT] += 1
-    return DDT
-
-
-def get_transitions(input_bit_size, output_bit_size, DDT):
-    # Get possible and impossible transitions from the DDT
-    possible_transitions = list()
-    impossible_transitions = list()    
-    for i in range(2**input_bit_size):
-        for j in range(2**output_bit_size):
-            x = bin(i)[2:].zfill(input_bit_size)
-            y = bin(j)[2:].zfill(output_bit_size)
-            point = [int(bit) for bit in x+y]
-            if DDT[i][j] > 0:
-                possible_transitions.append(point)
-            else:
-                impossible_transitions.append(point)
-    return possible_transitions,impossible_transitions
-
-
-def gen_new_ineqs(impossible_transitions, possible_transitions, k):
-    P = Polyhedron(vertices = possible_transitions)
-    convex_hull = list(P.Hrepresentation())
+from functools import partial
+import os
+import sys
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sbox_modeling.tables import SboxTransitions
+from sbox_modeling.kernel import evaluate, cut_matrix, tight_index
+from sbox_modeling.batch import load_sboxes, run_batch, write_atomic, result_path
+from sbox_modeling.cache import cached_hull
+from sbox_modeling.hull import convex_hull
+from sbox_modeling.dominance import DominanceFilter, prune_dominated
+from sbox_modeling.cover import min_cover, heuristic_cover
+from sbox_modeling.subcube import subcube_candidates
+from sbox_modeling.verify import verify, describe
+from sbox_modeling.store import ResultStore
+from sbox_modeling.telemetry import phase, set_context, enable, event_file, summarize, write_chrome_trace
+
+# Number of inequality subsets evaluated together in gen_new_ineqs
+SUBSET_BLOCK = 4096
+
+
+def gen_hull(possible_transitions, backend="auto"):
+    # Inequalities of the convex hull from one of the backends (numpy, cdd or sage)
+    return convex_hull(possible_transitions, backend)
+
+
+def gen_new_ineqs(impossible_transitions, possible_transitions, k, hull=None, hull_cuts=None):
+    convex_hull = gen_hull(possible_transitions) if hull is None else hull
 
     candidate_ineqs = set()
 
@@ -59,159 +35,159 @@ def gen_new_ineqs(impossible_transitions, possible_transitions, k):
     for q in convex_hull:
         candidate_ineqs.add(tuple(list(q)))
 
-    inequality_lists = {q: set() for q in convex_hull}
-    for q in convex_hull:
-        for point in impossible_transitions:
-            sum = q[0]
-            for i in range(len(point)):
-                sum += (q[i+1]*point[i])
-            if sum<0:
-                inequality_lists[q].add(tuple(point))
-
-    total_subset_set = set()
-    # Iterating over every possible transition
-    step = 1
-    for point in possible_transitions:
-        step += 1
-
-        # For each possible transition, taking all the inequalities it satisfies exactly i.e = 0
-        currpoint_inequalities = list()
-        for q in convex_hull:
-            sum = q[0]
-            for i in range(len(point)):
-                sum += (q[i+1]*point[i])
-            if sum==0:
-                currpoint_inequalities.append(q)
-        if k <= len(currpoint_inequalities):
-            subsets = list(combinations(currpoint_inequalities, k))
-            total_imp_transitions_removed = set()
-
-            # Iterating over each subset
-            for subset in subsets:
-                if subset in total_subset_set:
-                    continue
-                total_subset_set.add(frozenset(subset))
-
-                # Generating the new inequality
-                new_inequality = list(subset[0])
-                for i in range(1,len(subset)):
-                    for j in range(len(new_inequality)):
-                        new_inequality[j] += list(subset[i])[j]
-
-                # Finding the impossible transitions removed by this newly generated inequality
-                curr_imp_transitions_removed = set()
-                for point in impossible_transitions:
-                    sum = new_inequality[0]
-                    for i in range(len(point)):
-                        sum += (new_inequality[i+1]*point[i])
-                    if sum<0:
-                        curr_imp_transitions_removed.add(tuple(point))
-
-                # Checking if the impossible transitions removed by this are not in the original removed set
-                flag=0
-                for q in convex_hull:
-                    if len(curr_imp_transitions_removed) == 0:
-                        flag=1
-                        break
-                    if curr_imp_transitions_removed.issubset(inequality_lists[q]):
-                        flag=1
-                        break
-                if flag==0:
-                    candidate_ineqs.add(tuple(new_inequality))
-        else:
-            continue
+    if hull_cuts is None:
+        hull_cuts = cut_matrix(convex_hull, impossible_transitions)
+    dominance = DominanceFilter(hull_cuts.to_bool())
+
+    # For each possible transition, all the inequalities it satisfies exactly i.e = 0, found once
+    tight_facets = tight_index(convex_hull, possible_transitions)
+
+    # Every subset of k inequalities tight at a common possible transition, each subset only once
+    # (combinations of the sorted index lists are sorted tuples, so equal subsets get equal keys)
+    # (a subset is encoded as one integer in base len(convex_hull) so that np.unique can remove repeats)
+    base = np.int64(max(1, len(convex_hull)))
+    powers = base ** np.arange(k-1, -1, -1, dtype=np.int64)
+    keys = [np.zeros(0, dtype=np.int64)]
+    for facets in tight_facets:
+        if k <= len(facets):
+            keys.append(np.array(list(combinations(facets.tolist(), k)), dtype=np.int64) @ powers)
+    keys = np.unique(np.concatenate(keys))
+    subsets = (keys[:, None] // powers[None, :]) % base
+
+    # The value of a sum of inequalities is the sum of their values, so the impossible transitions removed
+    # by a new inequality come from the hull values without evaluating it again
+    hull_matrix = np.array([[int(c) for c in q] for q in convex_hull], dtype=np.int64)
+    imp_values = evaluate(convex_hull, impossible_transitions)
+    new_inequalities = [np.zeros((0, hull_matrix.shape[1]), dtype=np.int64)]
+    new_cuts = [np.zeros((0, len(impossible_transitions)), dtype=bool)]
+    for start in range(0, len(subsets), SUBSET_BLOCK):
+        block = subsets[start:start+SUBSET_BLOCK]
+        block_cuts = imp_values[block].sum(axis=1) < 0
+
+        # Keeping only the ones whose removed impossible transitions are not in the removed set of a hull inequality
+        survivors = ~dominance.dominated(block_cuts)
+        new_inequalities.append(hull_matrix[block[survivors]].sum(axis=1))
+        new_cuts.append(block_cuts[survivors])
+
+    # A new inequality removing a subset of what another new one removes is not needed either
+    new_inequalities = np.concatenate(new_inequalities)
+    new_cuts = np.concatenate(new_cuts)
+    for i in prune_dominated(new_cuts):
+        candidate_ineqs.add(tuple(new_inequalities[i].tolist()))
     return candidate_ineqs, len(convex_hull) 
 
 
-def check_inequalities(possible_transitions, impossible_transitions, final_ineqs):
-    for q in final_ineqs:
-        for point in possible_transitions:
-            sum = q[0]
-            for i in range(len(point)):
-                sum += (q[i+1]*point[i])
-            if sum<0:
-                return False
-        count = 0
-        for point in impossible_transitions:
-            sum = q[0]
-            for i in range(len(point)):
-                sum += (q[i+1]*point[i])
-            if sum>=0:
-                count += 1
-        if (count == len(impossible_transitions)):
-            return False
-    return True
-
-
-def preprocess(final_ineqs_list, impossible_transitions):
-    imp_trans_dict = {tuple(point): list() for point in impossible_transitions}
-    for point in impossible_transitions:
-        for i in range(len(final_ineqs_list)):
-            sum = final_ineqs_list[i][0]
-            for j in range(len(point)):
-                sum += (final_ineqs_list[i][j+1]*point[j])
-            if sum<0:
-                imp_trans_dict[tuple(point)].append(i)
-    return imp_trans_dict
+def subcube_cover(sbox, cover_time_limit=None, rounds=4):
+    # Scalable mode for 6 to 8 bit S boxes: no convex hull and no point lists. The candidates are the
+    # impossible subcubes around every impossible transition (see subcube_candidates), their cut matrix
+    # is memory-mapped from a temporary file, and the heuristic cover reads it block by block. The exact
+    # cover is not offered here: its presolve and MILP would unpack the whole matrix.
+    with phase("subcube_candidates", rounds=rounds) as info:
+        candidates = subcube_candidates(sbox.possible, sbox.impossible, sbox.n, rounds, seed=0)
+        info.update(candidates=len(candidates))
+    with tempfile.TemporaryDirectory() as tmp:
+        with phase("cut_matrix"):
+            cuts = cut_matrix(candidates, sbox.impossible_points, out=os.path.join(tmp, "cuts.npy"))
+        with phase("set_cover", cover_method="heuristic") as info:
+            cover, lower_bound = heuristic_cover(cuts, cover_time_limit)
+            info.update(inequalities=len(cover), lower_bound=lower_bound)
+        del cuts
+    print(f"{sbox.name}: {len(candidates)} subcube candidates, cover of {len(cover)}, lower bound {lower_bound}")
+    return [tuple(q) for q in candidates[cover].tolist()]
+
+
+def hull_cover(sbox, threads, hull_backend="auto", backend="auto", cover_method="exact", cover_time_limit=None):
+    # Convex hull facets plus the sums of pairs of them as candidates, then the minimum cover
+    possible_transitions = sbox.possible_points.tolist()
+    impossible_transitions = sbox.impossible_points.tolist()
+
+    # Convex hull, or reused from an earlier run on the same table pattern
+    with phase("gen_hull", backend=hull_backend) as info:
+        hull, hull_cuts = cached_hull(sbox, partial(gen_hull, backend=hull_backend))
+        info.update(facets=len(hull))
+
+    with phase("gen_new_ineqs", k=2) as info:
+        candidate_ineqs, sage_number = gen_new_ineqs(impossible_transitions, possible_transitions, 2, hull, hull_cuts)
+        candidate_ineqs_list = list(candidate_ineqs)
+        info.update(candidates=len(candidate_ineqs_list))
+
+    # Presolve, heuristic cover and, for the exact method, the MILP started from it.
+    # Points no candidate cuts are left out, as before
+    with phase("set_cover", cover_method=cover_method) as info:
+        cuts = cut_matrix(candidate_ineqs_list, impossible_transitions).to_bool()
+        cover, lower_bound = min_cover(cuts, cover_method, backend, threads, cover_time_limit, feasibility_tol=1e-9)
+        final_ineqs = [candidate_ineqs_list[i] for i in cover]
+        info.update(inequalities=len(final_ineqs), lower_bound=lower_bound)
+    return final_ineqs
+
 
 
 # In our fina l inequalities, the first term is constant and the terms that follow are coefficients of x1,x2,x3... then y1,y2,y3... respectively
+def run_sbox(raw_sbox, threads, hull_backend="auto", backend="auto", cover_method="exact", cover_time_limit=None, candidate_source="hull", subcube_rounds=4, table_type="DDT", store=None):
+    # Take S box from file input, generate its table (DDT by default) and get possible and impossible transitions
+    set_context(sbox=raw_sbox["name"], method="iterative")
+    if candidate_source == "subcube" and cover_method != "heuristic":
+        raise ValueError(f"candidate_source='subcube' needs cover_method='heuristic', not {cover_method!r}")
+    sbox = SboxTransitions(raw_sbox, table_type)
+    name = sbox.name
+    if candidate_source == "subcube":
+        final_ineqs = subcube_cover(sbox, cover_time_limit, subcube_rounds)
+    else:
+        final_ineqs = hull_cover(sbox, threads, hull_backend, backend, cover_method, cover_time_limit)
+
+    # Points no candidate cuts stay uncovered, which the check reports
+    report = verify(final_ineqs, sbox)
+    if not report["valid"]:
+        print(f"{name}: {describe(report)}")
+
+    # Results go to a directory named after the S box size, as the checked-in 4-bit_sboxes/ and 5-bit_sboxes/
+    write_atomic(result_path(f"{sbox.input_bit_size}-bit_sboxes/{name}_improved_MILP.txt", table_type), [str(list(q)) for q in final_ineqs])
+    if store is not None:
+        store.put("iterative", name, final_ineqs, table_type)
+    return len(final_ineqs)
+
+
 if __name__ == "__main__":
 
     # All S boxes are loaded into 'data'
-    f = open('../SBOXES/4_bit_sboxes.json')
-    data = json.load(f)
-    f.close()
+    data = load_sboxes('../SBOXES/4_bit_sboxes.json')
 
-    for val in data:
-        # Take S box from file input
-        name, input_bit_size, output_bit_size, s_box = get_sbox(val)
+    # Convex hull backend: "auto", "numpy", "cdd" or "sage"
+    hull_backend = "auto"
 
-        # Generate DDT
-        DDT = gen_DDT(input_bit_size, output_bit_size, s_box)
+    # MILP solver: "gurobi", "highs" or "auto" (Gurobi when installed, HiGHS otherwise)
+    backend = "auto"
 
-        # Get possible and impossible transitions
-        possible_transitions, impossible_transitions = get_transitions(input_bit_size, output_bit_size, DDT)
+    # Final cover: "exact" (MILP started from the heuristic cover) or "heuristic" (no MILP), optionally under a time limit in seconds
+    cover_method = "exact"
+    cover_time_limit = None
 
-        candidate_ineqs, sage_number = gen_new_ineqs(impossible_transitions, possible_transitions, 2)
-        candidate_ineqs_list = list(candidate_ineqs)
-        N = int(len(candidate_ineqs_list))
-
-        imp_trans_dict = preprocess(candidate_ineqs_list, impossible_transitions)
-        imp_trans_set = []
-        for point in impossible_transitions:
-            imp_trans_set.append(imp_trans_dict[tuple(point)])
-
-        # Create a Gurobi model
-        model = gp.Model()
-
-        # Create binary variables zi for i = 1 to N
-        z = model.addVars(N, vtype=GRB.BINARY, name="z")
-
-        # Objective function: minimize the sum of zi
-        model.setObjective(sum(z), GRB.MINIMIZE)
-
-        # Add inequalities to the model
-        for eq in imp_trans_set:
-            if len(eq)>0:
-                model.addConstr(gp.quicksum(z[i] for i in eq) >= 1)
-        
-        # Optimize the model
-        model.setParam('FeasibilityTol', 1e-9)
-        model.optimize()
-        # model.display()
-        # model.printQuality()
-
-        final_ineqs = list()
-        if model.status == GRB.OPTIMAL:
-            for i in range(N):
-                if int(z[i].x)==1:
-                    final_ineqs.append(candidate_ineqs_list[i])
-
-        # Dispose of the model
-        model.dispose()
-
-        file = open(f"5-bit_sboxes/{name}_improved_MILP.txt","a")
-        for q in final_ineqs:
-            file.write(str(list(q))+"\n")
-        file.close()
+    # Candidates: "hull" (convex hull plus summed facets) or "subcube" (no hull, for 6 to 8 bit S boxes; needs cover_method = "heuristic")
+    candidate_source = "hull"
+    subcube_rounds = 4
+
+    # Table the transitions come from: "DDT", "LAT", "BCT" (permutations only) or "DPT"; models of
+    # tables other than the DDT are written below a directory named after the table
+    table_type = "DDT"
+
+    # Binary store the results are also added to (see sbox_modeling/store.py), None to write the text files only
+    store = ResultStore()
+
+    # Per-phase timings, candidate counts and solver statistics as JSON lines (None: off), and the Chrome trace made from them
+    telemetry_file = None
+    trace_file = "trace.json"
+    enable(telemetry_file)
+
+    # Threads shared between the S boxes solved in parallel and the solver inside each of them
+    total_threads = os.cpu_count()
+
+    worker = partial(run_sbox, hull_backend=hull_backend, backend=backend, cover_method=cover_method, cover_time_limit=cover_time_limit, candidate_source=candidate_source, subcube_rounds=subcube_rounds, table_type=table_type, store=store)
+    for name, count, error in run_batch(worker, data, total_threads):
+        if error is not None:
+            print(f"{name}: failed with {error!r}")
+        else:
+            print(f"{name}: {count} inequalities")
+
+    if event_file():
+        summarize(event_file())
+        write_chrome_trace(event_file(), trace_file)
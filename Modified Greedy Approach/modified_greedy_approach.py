@@ -1,344 +1,107 @@
-import numpy as np
-import json
-import time
 import random as py_rand
-from sage.all import *
-
-
-
-def get_sbox(raw_sbox):
-    # Name of the S box
-    name = raw_sbox["name"]
-
-    # Input and output size of the S box
-    input_bit_size = int(raw_sbox["input"])
-    output_bit_size = int(raw_sbox["output"]) 
-
-    # S box in the form of an integer array
-    s_box = [0]*(2**input_bit_size)
-    for i in raw_sbox["s-box"]:
-        s_box[int(i)] = int(raw_sbox["s-box"][i])
-    return name, input_bit_size, output_bit_size, s_box
-
-
-def gen_DDT(input_bit_size, output_bit_size, s_box):
-    # Generate DDT from the obtained S box
-    DDT = np.zeros((2**input_bit_size,2**output_bit_size))
-    DDT = DDT.astype(int)
-    for p1 in range(2**input_bit_size):
-        for p2 in range(2**output_bit_size):
-            XOR_IN = p1 ^ p2
-            XOR_OUT = s_box[p1] ^ s_box[p2]
-            DDT[XOR_IN][XOR_OUT] += 1
-    return DDT
-
-
-def get_transitions(input_bit_size, output_bit_size, DDT):
-    # Get possible and impossible transitions from the DDT
-    possible_transitions = list()
-    impossible_transitions = list()    
-    for i in range(2**input_bit_size):
-        for j in range(2**output_bit_size):
-            x = bin(i)[2:].zfill(input_bit_size)
-            y = bin(j)[2:].zfill(output_bit_size)
-            point = [int(bit) for bit in x+y]
-            if DDT[i][j] > 0:
-                possible_transitions.append(point)
-            else:
-                impossible_transitions.append(point)
-    return possible_transitions,impossible_transitions
-
-
-def gen_inequalities(possible_transitions):
-    # Vertex representation of the possible transitions of the DDT            
-    P = Polyhedron(vertices = possible_transitions)
-
-    # Hyperplane representation i.e inequalities
-    inequalities = list(P.Hrepresentation())
+from functools import partial
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sbox_modeling.tables import SboxTransitions
+from sbox_modeling.kernel import cut_matrix
+from sbox_modeling.greedy import greedy_reduce
+from sbox_modeling.batch import load_sboxes, run_batch, write_atomic, result_path
+from sbox_modeling.cache import cached_hull
+from sbox_modeling.hull import convex_hull
+from sbox_modeling.verify import verify_many, describe
+from sbox_modeling.store import ResultStore, constant_first_matrix
+from sbox_modeling.telemetry import phase, set_context, enable, event_file, summarize, write_chrome_trace
+
+
+
+def gen_inequalities(possible_transitions, backend="auto"):
+    # Vertex representation of the possible transitions of the table, turned into the
+    # hyperplane representation i.e inequalities by one of the convex hull backends (numpy, cdd or sage)
+    inequalities = convex_hull(possible_transitions, backend)
 
     return inequalities
 
 
-def reduce_inequalities_first(impossible_transitions, inequalities):
-    final_ineqs = list()
-    # Greedy Approach
-    while(1):
-        max_count = 0
-        # For each inequality count the number of impossible transitions it can remove
-        inequality_lists = {q: list() for q in inequalities}
-        for q in inequalities:
-            count = 0
-            for point in impossible_transitions:
-                sum = q[0]
-                for i in range(len(point)):
-                    sum += (q[i+1]*point[i])
-                if sum<0:
-                    inequality_lists[q].append(point)
-                    count += 1
-            if count > max_count:
-                max_count = count
-        if(max_count==0):
-            break
-
-        # Obtaining the inequalities which can remove the maximum number of impossible transitions
-        max_ineqaulities_list = []
-        for q in inequalities:
-            if len(inequality_lists[q])==max_count:
-                max_ineqaulities_list.append(q)
-                # max_ineqaulity = q
-        
-        # Select one among these max inequalities
-        # First max
-        q = max_ineqaulities_list[0]
-
-        # # Mid max
-        # q = max_ineqaulities_list[(len(max_ineqaulities_list)-1)//2]
-
-        # # Last max
-        # q = max_ineqaulities_list[(len(max_ineqaulities_list)-1)]
-
-        # Random max
-        # x = py_rand.randint(0,len(max_ineqaulities_list)-1)
-        # q = max_ineqaulities_list[x]
-        max_ineqaulity = q
-
-        # Removing the max inequality from the list of inequalities and adding this to our final result
-        inequalities.remove(max_ineqaulity)
-        final_ineqs.append(max_ineqaulity)
-
-        # Impossible transitions removed by this inequality are to be removed from the set of impossible transitions
-        for p in inequality_lists[max_ineqaulity]:
-            impossible_transitions.remove(p)
-    return final_ineqs
-
-
-def reduce_inequalities_last(impossible_transitions, inequalities):
-    final_ineqs = list()
-    # Greedy Approach
-    while(1):
-        max_count = 0
-        # For each inequality count the number of impossible transitions it can remove
-        inequality_lists = {q: list() for q in inequalities}
-        for q in inequalities:
-            count = 0
-            for point in impossible_transitions:
-                sum = q[0]
-                for i in range(len(point)):
-                    sum += (q[i+1]*point[i])
-                if sum<0:
-                    inequality_lists[q].append(point)
-                    count += 1
-            if count > max_count:
-                max_count = count
-        if(max_count==0):
-            break
-
-        # Obtaining the inequalities which can remove the maximum number of impossible transitions
-        max_ineqaulities_list = []
-        for q in inequalities:
-            if len(inequality_lists[q])==max_count:
-                max_ineqaulities_list.append(q)
-                # max_ineqaulity = q
-        
-        # Select one among these max inequalities
-        # # First max
-        # q = max_ineqaulities_list[0]
-
-        # # Mid max
-        # q = max_ineqaulities_list[(len(max_ineqaulities_list)-1)//2]
-
-        # Last max
-        q = max_ineqaulities_list[(len(max_ineqaulities_list)-1)]
-
-        # # Random max
-        # x = py_rand.randint(0,len(max_ineqaulities_list)-1)
-        # q = max_ineqaulities_list[x]
-        max_ineqaulity = q
-
-        # Removing the max inequality from the list of inequalities and adding this to our final result
-        inequalities.remove(max_ineqaulity)
-        final_ineqs.append(max_ineqaulity)
-
-        # Impossible transitions removed by this inequality are to be removed from the set of impossible transitions
-        for p in inequality_lists[max_ineqaulity]:
-            impossible_transitions.remove(p)
-    return final_ineqs
-
-
-def reduce_inequalities_mid(impossible_transitions, inequalities):
-    final_ineqs = list()
-    # Greedy Approach
-    while(1):
-        max_count = 0
-        # For each inequality count the number of impossible transitions it can remove
-        inequality_lists = {q: list() for q in inequalities}
-        for q in inequalities:
-            count = 0
-            for point in impossible_transitions:
-                sum = q[0]
-                for i in range(len(point)):
-                    sum += (q[i+1]*point[i])
-                if sum<0:
-                    inequality_lists[q].append(point)
-                    count += 1
-            if count > max_count:
-                max_count = count
-        if(max_count==0):
-            break
-
-        # Obtaining the inequalities which can remove the maximum number of impossible transitions
-        max_ineqaulities_list = []
-        for q in inequalities:
-            if len(inequality_lists[q])==max_count:
-                max_ineqaulities_list.append(q)
-                # max_ineqaulity = q
-        
-        # Select one among these max inequalities
-        # # First max
-        # q = max_ineqaulities_list[0]
-
-        # Mid max
-        q = max_ineqaulities_list[(len(max_ineqaulities_list)-1)//2]
-
-        # # Last max
-        # q = max_ineqaulities_list[(len(max_ineqaulities_list)-1)//2]
-
-        # Random max
-        # x = py_rand.randint(0,len(max_ineqaulities_list)-1)
-        # q = max_ineqaulities_list[x]
-        max_ineqaulity = q
-
-        # Removing the max inequality from the list of inequalities and adding this to our final result
-        inequalities.remove(max_ineqaulity)
-        final_ineqs.append(max_ineqaulity)
-
-        # Impossible transitions removed by this inequality are to be removed from the set of impossible transitions
-        for p in inequality_lists[max_ineqaulity]:
-            impossible_transitions.remove(p)
-    return final_ineqs
-
-
-def reduce_inequalities_rand(impossible_transitions, inequalities):
-    final_ineqs = list()
-    rand_list = ""
-    # Greedy Approach
-    while(1):
-        max_count = 0
-        # For each inequality count the number of impossible transitions it can remove
-        inequality_lists = {q: list() for q in inequalities}
-        for q in inequalities:
-            count = 0
-            for point in impossible_transitions:
-                sum = q[0]
-                for i in range(len(point)):
-                    sum += (q[i+1]*point[i])
-                if sum<0:
-                    inequality_lists[q].append(point)
-                    count += 1
-            if count > max_count:
-                max_count = count
-        if(max_count==0):
-            break
-
-        # Obtaining the inequalities which can remove the maximum number of impossible transitions
-        max_ineqaulities_list = []
-        for q in inequalities:
-            if len(inequality_lists[q])==max_count:
-                max_ineqaulities_list.append(q)
-                # max_ineqaulity = q
-        
-        # Select one among these max inequalities
-        # # First max
-        # q = max_ineqaulities_list[0]
-
-        # # Mid max
-        # q = max_ineqaulities_list[(len(max_ineqaulities_list)-1)//2]
-
-        # # Last max
-        # q = max_ineqaulities_list[(len(max_ineqaulities_list)-1)//2]
-
-        # Random max
-        x = py_rand.randint(0,len(max_ineqaulities_list)-1)
-        rand_list += f" {x}:{len(max_ineqaulities_list)} "
-        q = max_ineqaulities_list[x]
-        max_ineqaulity = q
-
-        # Removing the max inequality from the list of inequalities and adding this to our final result
-        inequalities.remove(max_ineqaulity)
-        final_ineqs.append(max_ineqaulity)
+def reduce_inequalities(impossible_transitions, inequalities, policy="first", cuts=None):
+    # Greedy Approach: repeatedly take an inequality removing the most remaining impossible transitions
+    # policy selects one among the max inequalities: "first", "mid", "last" or "rand"
+    if cuts is None:
+        cuts = cut_matrix(inequalities, impossible_transitions)
+    selected, choices = greedy_reduce(cuts, policy, py_rand)
+    final_ineqs = [inequalities[i] for i in selected]
 
-        # Impossible transitions removed by this inequality are to be removed from the set of impossible transitions
-        for p in inequality_lists[max_ineqaulity]:
-            impossible_transitions.remove(p)
+    # Order chosen for a random result- index of chosen inequality:number of max inequalities
+    rand_list = "".join(f" {x}:{count} " for x, count in choices)
     return final_ineqs, rand_list
 
 
-def check_inequalities(possible_transitions, impossible_transitions, final_ineqs):
-    for q in final_ineqs:
-        for point in possible_transitions:
-            sum = q[0]
-            for i in range(len(point)):
-                sum += (q[i+1]*point[i])
-            if sum<0:
-                return False
-        count = 0
-        for point in impossible_transitions:
-            sum = q[0]
-            for i in range(len(point)):
-                sum += (q[i+1]*point[i])
-            if sum>=0:
-                count += 1
-        if (count == len(impossible_transitions)):
-            return False
-    return True
+def run_sbox(raw_sbox, threads, hull_backend="auto", table_type="DDT", store=None):
+    # Take S box from file input, generate its table (DDT by default) and get possible and impossible transitions
+    set_context(sbox=raw_sbox["name"], method="modified")
+    sbox = SboxTransitions(raw_sbox, table_type)
+    name = sbox.name
+    impossible_transitions = sbox.impossible_points.tolist()
+
+    # Generate Inequalities, or reuse them from an earlier run on the same table pattern
+    with phase("gen_inequalities", backend=hull_backend) as info:
+        inequalities, cuts = cached_hull(sbox, partial(gen_inequalities, backend=hull_backend))
+        info.update(candidates=len(inequalities))
+
+    # Reduce the inequalities
+    with phase("reduce_inequalities"):
+        final_ineqs_first, _ = reduce_inequalities(impossible_transitions, inequalities, "first", cuts)
+        final_ineqs_last, _ = reduce_inequalities(impossible_transitions, inequalities, "last", cuts)
+        final_ineqs_mid, _ = reduce_inequalities(impossible_transitions, inequalities, "mid", cuts)
+        final_ineqs_rand, rand_list = reduce_inequalities(impossible_transitions, inequalities, "rand", cuts)
+
+    # All four results checked with one evaluation
+    for policy, report in zip(("first", "last", "mid", "rand"), verify_many([final_ineqs_first, final_ineqs_last, final_ineqs_mid, final_ineqs_rand], sbox)):
+        if not report["valid"]:
+            print(f"{name}_{policy}: {describe(report)}")
+
+    write_atomic(result_path(f"{name}_first.txt", table_type), [str(list(q)) for q in final_ineqs_first])
+    write_atomic(result_path(f"{name}_last.txt", table_type), [str(list(q)) for q in final_ineqs_last])
+    write_atomic(result_path(f"{name}_mid.txt", table_type), [str(list(q)) for q in final_ineqs_mid])
+    write_atomic(result_path(f"Random/{name}_rand.txt", table_type), [str(list(q)) for q in final_ineqs_rand] + [
+        "Order chosen for this result- index of chosen inequality:number of max inequalities",
+        str(rand_list)])
+    if store is not None:
+        store.put_many("modified", {(name, table_type, policy): constant_first_matrix(q) for policy, q in
+                                    (("first", final_ineqs_first), ("last", final_ineqs_last), ("mid", final_ineqs_mid), ("rand", final_ineqs_rand))})
+    return len(final_ineqs_first), len(final_ineqs_last), len(final_ineqs_mid), len(final_ineqs_rand)
 
 
 if __name__ == "__main__":
 
     # All S boxes are loaded into 'data'
-    f = open('../SBOXES/4_bit_sboxes.json')
-    data = json.load(f)
-    f.close()
+    data = load_sboxes('../SBOXES/4_bit_sboxes.json')
 
-    for val in data:
-        # Take S box from file input
-        name, input_bit_size, output_bit_size, s_box = get_sbox(val)
+    # Convex hull backend: "auto", "numpy", "cdd" or "sage"
+    hull_backend = "auto"
 
-        # Generate DDT
-        DDT = gen_DDT(input_bit_size, output_bit_size, s_box)
+    # Table the transitions come from: "DDT", "LAT", "BCT" (permutations only) or "DPT"; models of
+    # tables other than the DDT are written below a directory named after the table
+    table_type = "DDT"
 
-        # Get possible and impossible transitions
-        possible_transitions, impossible_transitions = get_transitions(input_bit_size, output_bit_size, DDT)
+    # Binary store the results are also added to (see sbox_modeling/store.py), None to write the text files only
+    store = ResultStore()
 
-        impossible_transitions_1 = impossible_transitions.copy()
-        impossible_transitions_2 = impossible_transitions.copy()
-        impossible_transitions_3 = impossible_transitions.copy()
-        impossible_transitions_4 = impossible_transitions.copy()
+    # The greedy reduction runs no solver, every thread of the budget is a worker
+    total_threads = os.cpu_count()
 
-        # Generate Inequalities using sage
-        inequalities = gen_inequalities(possible_transitions)
+    # Per-phase timings, candidate counts and solver statistics as JSON lines (None: off), and the Chrome trace made from them
+    telemetry_file = None
+    trace_file = "trace.json"
+    enable(telemetry_file)
 
-        # Reduce the inequalities
-        final_ineqs_first = reduce_inequalities_first(impossible_transitions_1, inequalities)
-        final_ineqs_last = reduce_inequalities_last(impossible_transitions_2, inequalities)
-        final_ineqs_mid = reduce_inequalities_mid(impossible_transitions_3, inequalities)
-        final_ineqs_rand, rand_list = reduce_inequalities_rand(impossible_transitions_4, inequalities)
+    worker = partial(run_sbox, hull_backend=hull_backend, table_type=table_type, store=store)
+    for name, counts, error in run_batch(worker, data, total_threads):
+        if error is not None:
+            print(f"{name}: failed with {error!r}")
+        else:
+            print(f"{name}: first/last/mid/rand = {counts}")
 
-        f1 = open(f"{name}_first.txt","a")
-        for q in final_ineqs_first:
-            f1.write(str(list(q))+"\n")
-        f1.close()
-        f1 = open(f"{name}_last.txt","a")
-        for q in final_ineqs_last:
-            f1.write(str(list(q))+"\n")
-        f1.close()
-        f1 = open(f"{name}_mid.txt","a")
-        for q in final_ineqs_mid:
-            f1.write(str(list(q))+"\n")
-        f1.close()
-        f1 = open(f"Random/{name}_rand.txt","a")
-        for q in final_ineqs_last:
-            f1.write(str(list(q))+"\n")
-        f1.write(f"Order chosen for this result- index of chosen inequality:number of max inequalities\n")
-        f1.write(f"{str(rand_list)}")
-        f1.close()
\ No newline at end of file
+    if event_file():
+        summarize(event_file())
+        write_chrome_trace(event_file(), trace_file)
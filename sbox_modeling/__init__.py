@@ -0,0 +1 @@
+# Shared building blocks for the S-box modeling scripts
@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def load_sboxes(path):
+    # All S boxes of a catalogue file
+    f = open(path)
+    data = json.load(f)
+    f.close()
+    return data
+
+
+def split_threads(total_threads, n_jobs, workers=None):
+    # Share a global thread budget between pool workers and the solver threads of each worker
+    total_threads = max(1, total_threads or os.cpu_count() or 1)
+    if workers is None:
+        workers = min(n_jobs, total_threads)
+    workers = max(1, min(workers, n_jobs, total_threads))
+    return workers, max(1, total_threads // workers)
+
+
+def result_path(path, table_type="DDT"):
+    # DDT results keep their usual place, models of the other tables go to a directory named after the table
+    if table_type == "DDT":
+        return path
+    return os.path.join(table_type, path)
+
+
+def write_atomic(path, lines):
+    # Write a result file in one step so an interrupted run never leaves a partial file behind
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".txt")
+    try:
+        with os.fdopen(fd, "w") as f:
+            for line in lines:
+                f.write(line+"\n")
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def run_batch(worker, sboxes, total_threads=None, workers=None):
+    # Run worker(raw_sbox, threads) for every S box on a process pool
+    # Yields (name, result, error) as the S boxes finish; a failing S box does not stop the others
+    if not sboxes:
+        return
+    workers, threads = split_threads(total_threads, len(sboxes), workers)
+    if workers == 1:
+        for raw_sbox in sboxes:
+            try:
+                yield raw_sbox["name"], worker(raw_sbox, threads), None
+            except Exception as error:
+                yield raw_sbox["name"], None, error
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(worker, raw_sbox, threads): raw_sbox["name"] for raw_sbox in sboxes}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as error:
+                yield futures[future], None, error
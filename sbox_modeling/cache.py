@@ -0,0 +1,75 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+from sbox_modeling.kernel import CutMatrix, cut_matrix
+
+# Bump when the layout of the cached files or the order of the hull facets changes
+CACHE_VERSION = 2
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".hull_cache")
+
+
+def table_key(table, input_bit_size, output_bit_size, table_type="DDT"):
+    # Content address of a table: only its pattern of possible transitions matters,
+    # so every S box with the same pattern (e.g. affine equivalent ones) maps to the same key
+    pattern = np.packbits(np.asarray(table).reshape(-1) != 0)
+    h = hashlib.sha256()
+    h.update(f"v{CACHE_VERSION}:{table_type}:{input_bit_size}:{output_bit_size}:".encode())
+    h.update(pattern.tobytes())
+    return h.hexdigest()
+
+
+def compact_int_dtype(values):
+    # Smallest signed integer type holding every coefficient
+    largest = int(np.abs(values).max(initial=0))
+    for dtype in (np.int8, np.int16, np.int32):
+        if largest <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+class HullCache:
+    # On-disk store of convex hulls and their cut matrices, one compressed .npz file per key
+    def __init__(self, directory=None):
+        self.directory = directory or os.environ.get("SBOX_CACHE_DIR", DEFAULT_CACHE_DIR)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def load(self, key):
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            hull = [tuple(int(c) for c in q) for q in data["hull"]]
+            cuts = CutMatrix(data["cuts"], int(data["n_points"]))
+        return hull, cuts
+
+    def store(self, key, hull, cuts):
+        os.makedirs(self.directory, exist_ok=True)
+        H = np.array([[int(c) for c in q] for q in hull], dtype=np.int64)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp_", suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, hull=H.astype(compact_int_dtype(H)), cuts=cuts.packed, n_points=cuts.n_points)
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def cached_hull(sbox, compute_hull, cache=None):
+    # Convex hull of the possible transitions (constant first) and its cut matrix on the impossible
+    # transitions, computed by compute_hull(possible points) only when no run has stored them before
+    cache = HullCache() if cache is None else cache
+    key = table_key(sbox.table, sbox.input_bit_size, sbox.output_bit_size, sbox.table_type)
+    found = cache.load(key)
+    if found is not None:
+        return found
+    hull = [tuple(int(c) for c in q) for q in compute_hull(sbox.possible_points.tolist())]
+    cuts = cut_matrix(hull, sbox.impossible_points)
+    cache.store(key, hull, cuts)
+    return hull, cuts
@@ -0,0 +1,53 @@
+import json
+import os
+
+
+class CandidateLog:
+    # Append-only JSON lines log of the candidates found by a long run, one record per line.
+    # The file stays open; every record is flushed to the OS as soon as it is written, so a crash of the
+    # process loses nothing, and synced to disk every sync_every records, so a crash of the machine
+    # loses at most that many. With resume=True the records of an earlier run are read back first and a
+    # line cut short by the crash is dropped; otherwise the log starts empty.
+    def __init__(self, path, resume=False, sync_every=1):
+        self.path = path
+        self.sync_every = max(1, sync_every)
+        self.records = list()
+        valid_size = 0
+        if resume and os.path.exists(path):
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        self.records.append(json.loads(line))
+                    except ValueError:
+                        break
+                    valid_size += len(line)
+        self.file = open(path, "r+" if valid_size else "w")
+        self.file.truncate(valid_size)
+        self.file.seek(valid_size)
+        self.pending = 0
+
+    def append(self, record):
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.file.flush()
+        self.records.append(record)
+        self.pending += 1
+        if self.pending >= self.sync_every:
+            self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
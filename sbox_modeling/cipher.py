@@ -0,0 +1,179 @@
+import numpy as np
+from sbox_modeling.milp import create_model
+
+# Rows formatted and written at a time by the .lp / .mps writers
+WRITE_BLOCK = 4096
+
+
+class CipherLayout:
+    # An SPN round: a layer of identical S boxes followed by a bit permutation.
+    # State positions are numbered 0 .. state_bits-1, S box j reads positions j*sbox_bits .. j*sbox_bits+sbox_bits-1
+    # with the first one as its most significant bit (the order of point_matrix), and writes its output to the
+    # same positions. permutation[p] is the position output bit p moves to for the next round.
+    def __init__(self, sbox_bits, sbox_count, rounds, permutation):
+        self.sbox_bits = sbox_bits
+        self.sbox_count = sbox_count
+        self.state_bits = sbox_bits * sbox_count
+        self.rounds = rounds
+        self.permutation = np.asarray(permutation, dtype=np.int64)
+        if sorted(self.permutation.tolist()) != list(range(self.state_bits)):
+            raise ValueError("the bit permutation must be a permutation of the state positions")
+
+
+def bit_permutation_layout(sbox_bits, sbox_count, rounds, bit_permutation):
+    # Layout of a cipher whose specification numbers the state bits from the least significant one
+    # (bit 0 is the LSB of S box 0) and moves bit i to bit_permutation[i]
+    state_bits = sbox_bits * sbox_count
+    # Position of spec bit i: same S box, most significant bit first
+    position = (np.arange(state_bits) // sbox_bits) * sbox_bits + (sbox_bits - 1 - np.arange(state_bits) % sbox_bits)
+    bit_permutation = np.asarray(bit_permutation, dtype=np.int64)
+    permutation = np.zeros(state_bits, dtype=np.int64)
+    permutation[position] = position[bit_permutation]
+    return CipherLayout(sbox_bits, sbox_count, rounds, permutation)
+
+
+def present_layout(rounds):
+    # PRESENT: 16 4-bit S boxes, bit i goes to 16*i mod 63 (bit 63 stays)
+    i = np.arange(64)
+    return bit_permutation_layout(4, 16, rounds, np.where(i == 63, 63, (16 * i) % 63))
+
+
+def gift64_layout(rounds):
+    # GIFT-64: 16 4-bit S boxes, P(i) = 4*(i//16) + 16*((3*((i%16)//4) + i%4) % 4) + i%4
+    i = np.arange(64)
+    return bit_permutation_layout(4, 16, rounds, 4*(i//16) + 16*((3*((i % 16)//4) + i % 4) % 4) + i % 4)
+
+
+class RoundModel:
+    # Differential trail model of a whole cipher as flat arrays: binary variables, rows
+    # sum(coeffs * x[cols]) >= rhs in CSR form (starts), and the objective (number of active S boxes).
+    def __init__(self, names, starts, cols, coeffs, rhs, objective, state, active):
+        self.names = names
+        self.starts = starts
+        self.cols = cols
+        self.coeffs = coeffs
+        self.rhs = rhs
+        self.objective = objective
+        self.state = state
+        self.active = active
+
+    @property
+    def num_vars(self):
+        return len(self.names)
+
+    @property
+    def num_rows(self):
+        return len(self.rhs)
+
+    def to_model(self, backend="auto", threads=None, time_limit=None, verbose=True):
+        # The model on a solver backend, with every row added by one bulk call
+        M = create_model(backend, threads, time_limit, verbose)
+        M.add_vars(self.num_vars, lb=0, ub=1, name="x")
+        M.add_constrs(self.cols, self.coeffs, lb=self.rhs, starts=self.starts)
+        M.set_objective(self.objective, 1)
+        return M
+
+    def row_terms(self, start, end):
+        # " + 3 x_0_1 - 2 a_0_4 ..." for the rows start .. end-1
+        signs = np.where(self.coeffs < 0, "-", "+")
+        lines = list()
+        for r in range(start, end):
+            k = slice(self.starts[r], self.starts[r+1])
+            lines.append(" ".join(f"{s} {abs(c):g} {self.names[v]}" for s, c, v in zip(signs[k], self.coeffs[k], self.cols[k])))
+        return lines
+
+    def write_lp(self, path):
+        # CPLEX LP file, written block by block
+        with open(path, "w") as f:
+            f.write("\\ differential trail model\nMinimize\n obj: ")
+            f.write(" + ".join(self.names[v] for v in self.objective) + "\nSubject To\n")
+            for start in range(0, self.num_rows, WRITE_BLOCK):
+                end = min(start + WRITE_BLOCK, self.num_rows)
+                f.writelines(f" c{r}: {terms} >= {self.rhs[r]:g}\n" for r, terms in zip(range(start, end), self.row_terms(start, end)))
+            f.write("Binaries\n")
+            for start in range(0, self.num_vars, WRITE_BLOCK):
+                f.write(" " + " ".join(self.names[start:start+WRITE_BLOCK]) + "\n")
+            f.write("End\n")
+
+    def write_mps(self, path):
+        # Free MPS file. MPS lists the matrix by column, so the rows are sorted by column once
+        row_of = np.repeat(np.arange(self.num_rows), np.diff(self.starts))
+        order = np.argsort(self.cols, kind="stable")
+        col_starts = np.searchsorted(self.cols[order], np.arange(self.num_vars + 1))
+        in_objective = np.zeros(self.num_vars, dtype=bool)
+        in_objective[self.objective] = True
+        with open(path, "w") as f:
+            f.write("NAME differential_trail_model\nROWS\n N obj\n")
+            for start in range(0, self.num_rows, WRITE_BLOCK):
+                f.writelines(f" G c{r}\n" for r in range(start, min(start + WRITE_BLOCK, self.num_rows)))
+            f.write("COLUMNS\n MARKER 'MARKER' 'INTORG'\n")
+            for v in range(self.num_vars):
+                entries = order[col_starts[v]:col_starts[v+1]]
+                if in_objective[v]:
+                    f.write(f" {self.names[v]} obj 1\n")
+                f.writelines(f" {self.names[v]} c{r} {c:g}\n" for r, c in zip(row_of[entries], self.coeffs[entries]))
+            f.write(" MARKER 'MARKER' 'INTEND'\nRHS\n")
+            nonzero = np.flatnonzero(self.rhs != 0)
+            f.writelines(f" rhs c{r} {self.rhs[r]:g}\n" for r in nonzero)
+            f.write("BOUNDS\n")
+            f.writelines(f" BV bnd {name}\n" for name in self.names)
+            f.write("ENDATA\n")
+
+
+def stamp_rounds(inequalities, layout, constant_first=True):
+    # Differential trail model of layout.rounds rounds from the inequality system of its S box (over the
+    # input bits followed by the output bits, most significant first). Variables:
+    #   x_r_p  difference bit at state position p before the S layer of round r (r = 0 .. rounds)
+    #   a_r_j  S box j of round r is active
+    # The output of round r is x_(r+1) taken through the permutation, so it needs no variables of its own.
+    # Every S box of every round gets a copy of the inequalities and the activity rows
+    # a >= x_i and sum(x_i) >= a; at least one input bit is set. The objective counts the active S boxes.
+    Q = np.array([[int(c) for c in q] for q in inequalities], dtype=np.int64)
+    if not constant_first:
+        Q = np.column_stack([Q[:, -1], Q[:, :-1]])
+    m, count, R = layout.sbox_bits, layout.sbox_count, layout.rounds
+    if Q.shape[1] != 2*m + 1:
+        raise ValueError(f"inequalities over {Q.shape[1]-1} bits, the layout needs {2*m}")
+    state_bits = layout.state_bits
+
+    # Variable columns
+    state = np.arange((R+1) * state_bits).reshape(R+1, state_bits)
+    active = state.size + np.arange(R * count).reshape(R, count)
+    names = [f"x_{r}_{p}" for r in range(R+1) for p in range(state_bits)] + [f"a_{r}_{j}" for r in range(R) for j in range(count)]
+
+    # Input and output columns of every S box instance: output bit p of round r is x_(r+1)[permutation[p]]
+    inputs = state[:R].reshape(R * count, m)
+    outputs = state[1:][:, layout.permutation].reshape(R * count, m)
+    io = np.hstack([inputs, outputs])
+    flags = active.reshape(R * count)
+    instances = len(io)
+
+    # S box inequalities: one block of len(Q) rows per instance
+    k = len(Q)
+    sbox_cols = np.repeat(io, k, axis=0)
+    sbox_coeffs = np.tile(Q[:, 1:], (instances, 1))
+    sbox_rhs = np.tile(-Q[:, 0], instances)
+
+    # a - x_i >= 0 for every input bit, then sum(x_i) - a >= 0
+    bit_cols = np.stack([np.repeat(flags, m), inputs.reshape(-1)], axis=1)
+    bit_coeffs = np.tile([1, -1], (len(bit_cols), 1))
+    sum_cols = np.hstack([inputs, flags[:, None]])
+    sum_coeffs = np.tile(np.append(np.ones(m, dtype=np.int64), -1), (instances, 1))
+
+    # Rows of equal width are stacked, then all of them flattened with the zero coefficients dropped
+    blocks = [(sbox_cols, sbox_coeffs, sbox_rhs),
+              (bit_cols, bit_coeffs, np.zeros(len(bit_cols), dtype=np.int64)),
+              (sum_cols, sum_coeffs, np.zeros(instances, dtype=np.int64)),
+              (state[:1], np.ones((1, state_bits), dtype=np.int64), np.ones(1, dtype=np.int64))]
+    starts, cols, coeffs, rhs = [np.zeros(1, dtype=np.int64)], list(), list(), list()
+    offset = 0
+    for block_cols, block_coeffs, block_rhs in blocks:
+        nonzero = block_coeffs != 0
+        ends = offset + np.cumsum(nonzero.sum(axis=1))
+        starts.append(ends)
+        offset = ends[-1] if len(ends) else offset
+        cols.append(block_cols[nonzero])
+        coeffs.append(block_coeffs[nonzero])
+        rhs.append(block_rhs)
+    return RoundModel(names, np.concatenate(starts), np.concatenate(cols), np.concatenate(coeffs).astype(float),
+                      np.concatenate(rhs).astype(float), active.reshape(-1), state, active)
@@ -0,0 +1,211 @@
+import heapq
+import time
+
+import numpy as np
+from sbox_modeling.kernel import CutMatrix
+from sbox_modeling.presolve import presolve_cover
+from sbox_modeling.milp import create_model, OPTIMAL
+from sbox_modeling.telemetry import phase
+
+# How the minimum cover is found: MILP with a heuristic start, or the heuristic alone
+COVER_METHODS = ("exact", "heuristic")
+
+# Subgradient steps without a better lower bound before the step size is halved
+PATIENCE = 20
+# The search stops once the step size factor falls below this
+MIN_STEP = 1e-4
+# Inequalities unpacked at a time when a CutMatrix (possibly memory-mapped) is read
+UNPACK_ROWS = 4096
+
+
+class CoverInstance:
+    # Sparse unit-cost set cover: column j (an inequality) covers the rows (points) it cuts.
+    # Both directions are stored CSR-style so every pass is a few flat NumPy operations.
+    def __init__(self, cuts):
+        # A CutMatrix is unpacked block by block, so only the nonzeros are ever held in memory
+        if isinstance(cuts, CutMatrix):
+            self.n_cols, self.n_rows = cuts.n_inequalities, cuts.n_points
+            col_of, row_of = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+            for start in range(0, self.n_cols, UNPACK_ROWS):
+                block = np.unpackbits(np.asarray(cuts.packed[start:start+UNPACK_ROWS]), axis=1, count=self.n_rows, bitorder='little')
+                c, r = np.nonzero(block)
+                col_of.append(c + start)
+                row_of.append(r)
+            col_of, row_of = np.concatenate(col_of), np.concatenate(row_of)
+        else:
+            cuts = np.asarray(cuts, dtype=bool)
+            self.n_cols, self.n_rows = cuts.shape
+            col_of, row_of = np.nonzero(cuts)
+        self.col_ptr = np.searchsorted(col_of, np.arange(self.n_cols+1))
+        self.col_rows = row_of
+        self.nnz_col = col_of
+        order = np.argsort(row_of, kind='stable')
+        self.row_ptr = np.searchsorted(row_of[order], np.arange(self.n_rows+1))
+        self.row_cols = col_of[order]
+        self.coverable = np.diff(self.row_ptr) > 0
+
+    def reduced_costs(self, u):
+        # 1 - sum of the multipliers of the rows each column covers
+        return 1 - np.bincount(self.nnz_col, weights=u[self.col_rows], minlength=self.n_cols)
+
+    def coverage(self, x):
+        # How many chosen columns cover each row
+        return np.bincount(self.col_rows, weights=x[self.nnz_col], minlength=self.n_rows).astype(np.int64)
+
+    def complete(self, x, costs):
+        # Adds, for every uncovered row in turn, its cheapest covering column under costs
+        count = self.coverage(x)
+        for i in np.flatnonzero((count == 0) & self.coverable):
+            if count[i]:
+                continue
+            cols = self.row_cols[self.row_ptr[i]:self.row_ptr[i+1]]
+            j = cols[np.argmin(costs[cols])]
+            x[j] = True
+            count[self.col_rows[self.col_ptr[j]:self.col_ptr[j+1]]] += 1
+        return x, count
+
+    def greedy(self):
+        # Greedy cover, the column covering the most uncovered rows first (ties: lowest index),
+        # with a lazy max-heap as in greedy_reduce
+        counts = np.diff(self.col_ptr).astype(np.int64)
+        covered = ~self.coverable.copy()
+        heap = [(-int(c), j) for j, c in enumerate(counts) if c > 0]
+        heapq.heapify(heap)
+        x = np.zeros(self.n_cols, dtype=bool)
+        while heap:
+            c, j = heapq.heappop(heap)
+            if -c != counts[j]:
+                if counts[j] > 0:
+                    heapq.heappush(heap, (-int(counts[j]), j))
+                continue
+            x[j] = True
+            rows = self.col_rows[self.col_ptr[j]:self.col_ptr[j+1]]
+            rows = rows[~covered[rows]]
+            covered[rows] = True
+            touched = np.concatenate([self.row_cols[self.row_ptr[i]:self.row_ptr[i+1]] for i in rows])
+            np.subtract.at(counts, touched, 1)
+        return x
+
+    def drop_redundant(self, x, count, costs):
+        # Removes chosen columns whose rows are all covered twice, most expensive first
+        for j in sorted(np.flatnonzero(x), key=lambda j: -costs[j]):
+            rows = self.col_rows[self.col_ptr[j]:self.col_ptr[j+1]]
+            if (count[rows] > 1).all():
+                x[j] = False
+                count[rows] -= 1
+        return x
+
+
+def heuristic_cover(cuts, time_limit=None, max_iterations=2000, seed=None):
+    # Set cover over an (inequalities x points) cut matrix without a MILP solver:
+    # a greedy cover, improved by Lagrangian relaxation with subgradient steps. Every step's
+    # multipliers give a lower bound, and the columns with negative reduced cost, completed and
+    # stripped of redundant columns, give a new cover.
+    # Returns (cover, lower_bound): sorted indices of the best cover found and a proven lower bound
+    # on the minimum cover size. Points no inequality cuts are ignored.
+    start = time.time()
+    inst = CoverInstance(cuts)
+    rng = np.random.default_rng(seed)
+    rows = np.flatnonzero(inst.coverable)
+    if len(rows) == 0:
+        return np.zeros(0, dtype=np.int64), 0
+
+    x = inst.greedy()
+    x = inst.drop_redundant(x, inst.coverage(x), -np.diff(inst.col_ptr).astype(float))
+    best = np.flatnonzero(x)
+    lower_bound = 0
+
+    # Multipliers start at the inverse of the row degree
+    degree = np.diff(inst.row_ptr)
+    u = np.zeros(inst.n_rows)
+    u[rows] = 1.0 / degree[rows]
+    step = 1.0
+    stall = 0
+    best_value = -np.inf
+    for _ in range(max_iterations):
+        if lower_bound >= len(best) or step < MIN_STEP:
+            break
+        if time_limit is not None and time.time() - start > time_limit:
+            break
+
+        costs = inst.reduced_costs(u)
+        chosen = costs < 0
+        value = u[rows].sum() + costs[chosen].sum()
+        if value > best_value + 1e-9:
+            best_value = value
+            stall = 0
+        else:
+            stall += 1
+            if stall >= PATIENCE:
+                step /= 2
+                stall = 0
+        # Unit costs, so the bound can be rounded up
+        lower_bound = max(lower_bound, int(np.ceil(value - 1e-6)))
+
+        # Lagrangian heuristic, with a little noise so ties are broken differently between steps
+        x, count = inst.complete(chosen.copy(), costs + rng.uniform(0, 1e-6, inst.n_cols))
+        x = inst.drop_redundant(x, count, costs)
+        if x.sum() < len(best):
+            best = np.flatnonzero(x)
+
+        # Subgradient step towards the uncovered rows of the relaxed solution
+        g = np.zeros(inst.n_rows)
+        g[rows] = 1 - inst.coverage(chosen)[rows]
+        norm = (g**2).sum()
+        if norm == 0:
+            # The relaxed solution is itself a cover, so it is optimal
+            lower_bound = max(lower_bound, int(chosen.sum()))
+            break
+        u = np.maximum(0, u + step * (len(best) - value) / norm * g)
+    return best, min(lower_bound, len(best))
+
+
+def min_cover(cuts, method="exact", backend="auto", threads=None, time_limit=None, feasibility_tol=None):
+    # Fewest inequalities cutting every coverable point, for an (inequalities x points) cut matrix.
+    # The problem is presolved first and the heuristic cover computed on what is left.
+    # method="heuristic" returns that cover. method="exact" passes it as MIP start to the solver
+    # unless its lower bound already proves it optimal, and falls back to it when the solver ends
+    # without a solution.
+    # Returns (cover, lower_bound) with cover as sorted indices into cuts.
+    if method not in COVER_METHODS:
+        raise ValueError(f"unknown cover method {method!r}, expected one of {COVER_METHODS}")
+    if isinstance(cuts, CutMatrix):
+        cuts = cuts.to_bool()
+    cuts = np.asarray(cuts, dtype=bool)
+    begin = time.time()
+    with phase("presolve", columns=cuts.shape[0], rows=cuts.shape[1]) as info:
+        fixed, columns, rows, uncovered = presolve_cover(cuts)
+        info.update(fixed=len(fixed), reduced_columns=len(columns), reduced_rows=len(rows))
+    if len(rows) == 0:
+        return fixed, len(fixed)
+
+    sub = cuts[np.ix_(columns, rows)]
+    with phase("heuristic_cover") as info:
+        cover, lower_bound = heuristic_cover(sub, time_limit)
+        info.update(cover=len(cover), lower_bound=lower_bound)
+    if method == "exact" and lower_bound < len(cover):
+        # The solver gets what is left of the time limit
+        if time_limit is not None:
+            time_limit = max(1, time_limit - (time.time() - begin))
+        with phase("cover_milp", start_cover=len(cover)) as info:
+            M = create_model(backend, threads, time_limit, feasibility_tol=feasibility_tol)
+            z = M.add_vars(len(columns), lb=0, ub=1, name="z")
+            # One covering row per point, straight from the nonzeros of the cut matrix (CSR by point)
+            point, column = np.nonzero(sub.T)
+            M.add_constrs(z[column], 1, lb=1, starts=np.searchsorted(point, np.arange(len(rows)+1)))
+            M.set_objective(z, 1)
+            start = np.zeros(len(columns))
+            start[cover] = 1
+            M.set_start(z, start)
+            M.optimize()
+            if M.has_solution:
+                solution = np.flatnonzero(np.round(M.values(z)) == 1)
+                if len(solution) <= len(cover) and sub[solution].any(axis=0).all():
+                    cover = solution
+                if M.status == OPTIMAL:
+                    lower_bound = len(cover)
+                else:
+                    lower_bound = max(lower_bound, int(np.ceil(M.bound - 1e-6)))
+            M.dispose()
+            info.update(cover=len(cover), lower_bound=lower_bound)
+    return np.sort(np.concatenate([fixed, columns[cover]])), len(fixed) + lower_bound
@@ -0,0 +1,89 @@
+import numpy as np
+
+# Upper bound on the words compared in one vectorized dominance step
+WORK_LIMIT = 1 << 22
+
+
+def pack_words(cuts):
+    # Bool matrix (sets x points) to rows of 64-bit machine words, bit j of a row set when point j is in the set
+    cuts = np.asarray(cuts, dtype=bool)
+    packed = np.packbits(cuts, axis=1, bitorder='little')
+    padded = np.zeros((len(cuts), -(-cuts.shape[1]//64)*8), dtype=np.uint8)
+    padded[:, :packed.shape[1]] = packed
+    return padded.view('<u8')
+
+
+class SubsetIndex:
+    # Cut sets as machine-word bitsets with a point -> sets index answering "is this set contained in a stored one"
+    # A query only scans the stored sets containing the query's rarest point
+    def __init__(self, n_points, capacity=1024):
+        self.n_points = n_points
+        self.words = np.zeros((capacity, max(1, -(-n_points//64))), dtype='<u8')
+        self.size = 0
+        self.containing = [list() for _ in range(n_points)]
+        self.counts = np.zeros(n_points, dtype=np.int64)
+
+    def add(self, words, points):
+        if self.size == len(self.words):
+            self.words = np.concatenate([self.words, np.zeros_like(self.words)])
+        self.words[self.size] = words
+        for j in points:
+            self.containing[j].append(self.size)
+        self.counts[points] += 1
+        self.size += 1
+
+    def has_superset(self, words, points):
+        if len(points) == 0:
+            return True
+        rarest = points[np.argmin(self.counts[points])]
+        ids = self.containing[rarest]
+        if not ids:
+            return False
+        S = self.words[ids]
+        return bool(((S & words) == words).all(axis=1).any())
+
+
+class DominanceFilter:
+    # Drops cut sets that are empty or contained in one of the reference cut sets (e.g. the hull facets)
+    # Queries are grouped by their rarest point and each group is tested with word-wise AND against
+    # only the references containing that point
+    def __init__(self, reference_cuts):
+        reference_cuts = np.asarray(reference_cuts, dtype=bool)
+        self.reference = pack_words(reference_cuts)
+        self.counts = reference_cuts.sum(axis=0)
+        self.containing = [np.flatnonzero(column) for column in reference_cuts.T]
+
+    def dominated(self, cuts):
+        # Bool mask over the rows of cuts
+        cuts = np.asarray(cuts, dtype=bool)
+        words = pack_words(cuts)
+        mask = ~cuts.any(axis=1)
+        rarest = np.where(cuts, self.counts[None, :], len(self.reference)+1).argmin(axis=1)
+        for p in np.unique(rarest[~mask]):
+            rows = np.flatnonzero((rarest == p) & ~mask)
+            R = self.reference[self.containing[p]]
+            if len(R) == 0:
+                continue
+            step = max(1, WORK_LIMIT // R.size)
+            for start in range(0, len(rows), step):
+                C = words[rows[start:start+step], None, :]
+                mask[rows[start:start+step]] = ((C & R[None, :, :]) == C).all(axis=2).any(axis=1)
+        return mask
+
+
+def prune_dominated(cuts):
+    # Indices of the cut sets not contained in another one; of equal sets only the first is kept
+    # Larger sets go first, so every superset of a set has been seen (or dominated by a kept one) before it
+    cuts = np.asarray(cuts, dtype=bool)
+    if len(cuts) == 0:
+        return np.zeros(0, dtype=np.int64)
+    order = np.argsort(-cuts.sum(axis=1), kind='stable')
+    words = pack_words(cuts)
+    index = SubsetIndex(cuts.shape[1])
+    kept = list()
+    for i in order:
+        points = np.flatnonzero(cuts[i])
+        if not index.has_superset(words[i], points):
+            index.add(words[i], points)
+            kept.append(i)
+    return np.sort(np.array(kept, dtype=np.int64))
@@ -0,0 +1,76 @@
+import heapq
+import random
+
+import numpy as np
+
+# Tie-break policies: which of the inequalities removing the most points is taken
+POLICIES = ("first", "mid", "last", "rand")
+
+
+def pick_tie(ties, policy, rng):
+    # ties are sorted by position in the original inequality list
+    if policy == "first":
+        return 0
+    if policy == "mid":
+        return (len(ties)-1)//2
+    if policy == "last":
+        return len(ties)-1
+    if policy == "rand":
+        return rng.randint(0, len(ties)-1)
+    raise ValueError(f"unknown tie-break policy {policy!r}, expected one of {POLICIES}")
+
+
+def greedy_reduce(cuts, policy="first", rng=None):
+    # Greedy set cover over a CutMatrix (inequalities x impossible points)
+    # Returns the indices of the chosen inequalities in the order they were picked,
+    # and for every pick the (index in tie list, size of tie list) pair
+    rng = random if rng is None else rng
+    cut_bool = cuts.to_bool()
+    counts = cut_bool.sum(axis=1).astype(np.int64)
+    alive = np.ones(cuts.n_inequalities, dtype=bool)
+    remaining = np.ones(cuts.n_points, dtype=bool)
+
+    # Inverted index: the inequalities removing each point, so a removal only touches those
+    point_ineqs = [np.flatnonzero(cut_bool[:, j]) for j in range(cuts.n_points)]
+
+    # Lazy max-heap of (-count, index); an entry is stale once counts[index] has moved on
+    heap = [(-int(c), i) for i, c in enumerate(counts) if c > 0]
+    heapq.heapify(heap)
+
+    def valid(entry):
+        return alive[entry[1]] and counts[entry[1]] == -entry[0]
+
+    selected = list()
+    choices = list()
+    while heap:
+        while heap and not valid(heap[0]):
+            heapq.heappop(heap)
+        if not heap:
+            break
+
+        # All inequalities removing the maximum number of points
+        max_count = -heap[0][0]
+        ties = list()
+        while heap and -heap[0][0] == max_count:
+            entry = heapq.heappop(heap)
+            if valid(entry):
+                ties.append(entry[1])
+        ties.sort()
+
+        x = pick_tie(ties, policy, rng)
+        chosen = ties[x]
+        choices.append((x, len(ties)))
+        selected.append(chosen)
+        alive[chosen] = False
+        for i in ties[:x] + ties[x+1:]:
+            heapq.heappush(heap, (-max_count, i))
+
+        # Remove the points of the chosen inequality and update the counts of the inequalities sharing them
+        removed = np.flatnonzero(cut_bool[chosen] & remaining)
+        remaining[removed] = False
+        touched = np.concatenate([point_ineqs[j] for j in removed])
+        np.subtract.at(counts, touched, 1)
+        for i in np.unique(touched):
+            if alive[i] and counts[i] > 0:
+                heapq.heappush(heap, (-int(counts[i]), int(i)))
+    return selected, choices
@@ -0,0 +1,172 @@
+from fractions import Fraction
+from math import gcd, lcm
+
+import numpy as np
+
+# Backends tried by "auto", fastest first; "sage" is only used when asked for
+BACKENDS = ("cdd", "numpy", "sage")
+AUTO_BACKENDS = ("cdd", "numpy")
+
+
+def primitive(vector):
+    # Scale a rational vector to the integer vector with coprime entries pointing the same way
+    vector = [Fraction(c) for c in vector]
+    denominator = lcm(*(c.denominator for c in vector))
+    ints = [int(c*denominator) for c in vector]
+    divisor = gcd(*ints) or 1
+    return tuple(c//divisor for c in ints)
+
+
+def integer_normal(rows):
+    # Integer vector orthogonal to n-1 integer rows of length n, None when the rows are not independent
+    n = len(rows[0])
+    R = [[Fraction(c) for c in row] for row in rows]
+    pivots = list()
+    r = 0
+    for col in range(n):
+        pivot = next((i for i in range(r, len(R)) if R[i][col] != 0), None)
+        if pivot is None:
+            continue
+        R[r], R[pivot] = R[pivot], R[r]
+        R[r] = [c/R[r][col] for c in R[r]]
+        for i in range(len(R)):
+            if i != r and R[i][col] != 0:
+                factor = R[i][col]
+                R[i] = [a - factor*b for a, b in zip(R[i], R[r])]
+        pivots.append(col)
+        r += 1
+    if r != n-1:
+        return None
+    free = next(col for col in range(n) if col not in pivots)
+    normal = [Fraction(0)]*n
+    normal[free] = Fraction(1)
+    for i, col in enumerate(pivots):
+        normal[col] = -R[i][free]
+    return primitive(normal)
+
+
+def check_full_dimensional(P):
+    if len(P) == 0 or np.linalg.matrix_rank(P[1:] - P[0]) < P.shape[1]:
+        raise ValueError("the possible transitions do not span a full-dimensional polytope")
+
+
+def popcount(words):
+    # Number of set bits in each row of a uint64 matrix
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=-1)
+    return np.unpackbits(words.view(np.uint8), axis=-1).sum(axis=-1)
+
+
+def hull_numpy(points):
+    # Double description method in exact int64 arithmetic: the facets of conv(points) are the extreme
+    # rays (b, a) of the cone b + a x >= 0 for all points x, built by adding one point at a time.
+    # Two rays are combined only when they are adjacent, which is tested combinatorially on the
+    # bitsets of the constraints tight at each ray.
+    P = np.asarray(points, dtype=np.int64)
+    check_full_dimensional(P)
+    m, n = P.shape
+    d = n+1
+    C = np.hstack([np.ones((m, 1), dtype=np.int64), P])
+
+    # Start from the simplicial cone of d affinely independent points
+    basis = list()
+    for i in range(m):
+        if np.linalg.matrix_rank(C[basis + [i]]) == len(basis)+1:
+            basis.append(i)
+            if len(basis) == d:
+                break
+    in_basis = set(basis)
+    C = C[basis + [i for i in range(m) if i not in in_basis]]
+
+    W = (m+63)//64
+    R = np.zeros((d, d), dtype=np.int64)
+    Z = np.zeros((d, W), dtype=np.uint64)
+    for j in range(d):
+        r = np.array(integer_normal([C[k].tolist() for k in range(d) if k != j]), dtype=np.int64)
+        R[j] = r if C[j] @ r > 0 else -r
+        for k in range(d):
+            if k != j:
+                Z[j, k//64] |= np.uint64(1) << np.uint64(k % 64)
+
+    for k in range(d, m):
+        values = R @ C[k]
+        pos = np.flatnonzero(values > 0)
+        neg = np.flatnonzero(values < 0)
+        bit = np.uint64(1) << np.uint64(k % 64)
+        new_R = list()
+        new_Z = list()
+        for p in pos if len(neg) else ():
+            # Pairs sharing too few tight constraints cannot be adjacent
+            common = Z[p] & Z[neg]
+            candidates = np.flatnonzero(popcount(common) >= d-2)
+            if len(candidates) == 0:
+                continue
+            # Adjacent when no third ray is tight on all the constraints the pair shares
+            contained = np.zeros(len(candidates), dtype=np.int64)
+            step = max(1, 2000000 // (len(R)*W))
+            for s in range(0, len(candidates), step):
+                cc = common[candidates[s:s+step]]
+                contained[s:s+step] = ((Z[None, :, :] & cc[:, None, :]) == cc[:, None, :]).all(axis=-1).sum(axis=1)
+            for c in candidates[contained == 2]:
+                q = neg[c]
+                r = values[p]*R[q] - values[q]*R[p]
+                new_R.append(r // np.gcd.reduce(np.abs(r)))
+                z = common[c].copy()
+                z[k//64] |= bit
+                new_Z.append(z)
+
+        Z[values == 0, k//64] |= bit
+        keep = values >= 0
+        R = R[keep]
+        Z = Z[keep]
+        if new_R:
+            R = np.vstack([R, np.array(new_R)])
+            Z = np.vstack([Z, np.array(new_Z)])
+    return sorted(tuple(int(c) for c in r) for r in R)
+
+
+def hull_cdd(points):
+    # Exact double description through pycddlib, supports both the 2.x and the 3.x interface
+    import cdd
+
+    P = np.asarray(points, dtype=np.int64)
+    check_full_dimensional(P)
+    rows = [[1] + [int(c) for c in p] for p in P]
+    if hasattr(cdd, "Matrix"):
+        mat = cdd.Matrix(rows, number_type='fraction')
+        mat.rep_type = cdd.RepType.GENERATOR
+        H = cdd.Polyhedron(mat).get_inequalities()
+        array = [H[i] for i in range(H.row_size)]
+    else:
+        import cdd.gmp
+        mat = cdd.gmp.matrix_from_array(rows, rep_type=cdd.RepType.GENERATOR)
+        array = cdd.gmp.copy_inequalities(cdd.gmp.polyhedron_from_matrix(mat)).array
+    return sorted(set(primitive(row) for row in array))
+
+
+def hull_sage(points):
+    from sage.all import Polyhedron
+
+    P = Polyhedron(vertices = [list(p) for p in points])
+    return [tuple(int(c) for c in q) for q in P.Hrepresentation()]
+
+
+def convex_hull(points, backend="auto"):
+    # H-representation of the convex hull of 0/1 points, each inequality as (b, a1, ..., an) with b + a x >= 0.
+    # Every backend returns the facets in the same order, sorted as primitive integer vectors: the tie-breaks of
+    # the Modified Greedy Approach depend on it, and the hull cache does not record which backend filled it
+    if backend == "auto":
+        for name in AUTO_BACKENDS:
+            try:
+                return convex_hull(points, name)
+            except ImportError:
+                continue
+    if backend == "numpy":
+        facets = hull_numpy(points)
+    elif backend == "cdd":
+        facets = hull_cdd(points)
+    elif backend == "sage":
+        facets = hull_sage(points)
+    else:
+        raise ValueError(f"unknown convex hull backend {backend!r}, expected 'auto' or one of {BACKENDS}")
+    return sorted(set(primitive(q) for q in facets))
@@ -0,0 +1,87 @@
+import numpy as np
+
+# Number of inequalities evaluated per matrix product, keeps the int64 value block small
+BLOCK_SIZE = 4096
+# Upper bound on the entries of one int64 value block, so wide point sets get fewer inequalities per block
+BLOCK_ENTRIES = 1 << 24
+
+
+def inequality_matrix(inequalities, n, constant_first=True):
+    # Split inequalities into a coefficient matrix A and a constant vector b so that q(x) = A x + b
+    # Sage outputs put the constant first, the MILP outputs put it last
+    Q = np.array([[int(c) for c in q] for q in inequalities], dtype=np.int64).reshape(len(inequalities), n+1)
+    if constant_first:
+        return Q[:, 1:], Q[:, 0]
+    return Q[:, :-1], Q[:, -1]
+
+
+def point_array(points, inequalities):
+    # Points as an int64 matrix, the width is taken from the inequalities when there are no points
+    P = np.asarray(points, dtype=np.int64)
+    if P.ndim != 2:
+        P = P.reshape(len(P), len(inequalities[0])-1 if len(inequalities) else 0)
+    return P
+
+
+def evaluate(inequalities, points, constant_first=True):
+    # (inequalities x points) matrix holding the value of every inequality at every point
+    P = point_array(points, inequalities)
+    A, b = inequality_matrix(inequalities, P.shape[1], constant_first)
+    return A @ P.T + b[:, None]
+
+
+class CutMatrix:
+    # Which inequality cuts (evaluates negative on) which point, packed 8 points per byte
+    def __init__(self, packed, n_points):
+        self.packed = packed
+        self.n_inequalities = packed.shape[0]
+        self.n_points = n_points
+
+    def to_bool(self):
+        return np.unpackbits(self.packed, axis=1, count=self.n_points, bitorder='little').astype(bool)
+
+    def row(self, i):
+        return np.flatnonzero(np.unpackbits(self.packed[i], count=self.n_points, bitorder='little'))
+
+    def counts(self):
+        # Number of points cut by each inequality
+        return np.unpackbits(self.packed, axis=1, count=self.n_points, bitorder='little').sum(axis=1)
+
+    def covered(self):
+        # Points cut by at least one inequality
+        return np.unpackbits(np.bitwise_or.reduce(self.packed, axis=0), count=self.n_points, bitorder='little').astype(bool)
+
+    def bitsets(self):
+        # One Python integer per inequality, bit j set when point j is cut
+        return [int.from_bytes(row.tobytes(), 'little') for row in self.packed]
+
+
+def cut_matrix(inequalities, points, constant_first=True, out=None):
+    # Evaluate all inequalities on all points with one integer matrix product per block
+    # With out (a .npy path) the packed matrix is written to a memory-mapped file instead of held in memory
+    P = point_array(points, inequalities)
+    A, b = inequality_matrix(inequalities, P.shape[1], constant_first)
+    shape = (len(A), (len(P)+7)//8)
+    if out is None:
+        packed = np.zeros(shape, dtype=np.uint8)
+    else:
+        packed = np.lib.format.open_memmap(out, mode='w+', dtype=np.uint8, shape=shape)
+    step = max(1, min(BLOCK_SIZE, BLOCK_ENTRIES // max(1, len(P))))
+    for start in range(0, len(A), step):
+        values = A[start:start+step] @ P.T + b[start:start+step, None]
+        packed[start:start+step] = np.packbits(values < 0, axis=1, bitorder='little')
+    if out is not None:
+        packed.flush()
+    return CutMatrix(packed, len(P))
+
+
+def tight_index(inequalities, points, constant_first=True):
+    # Incidence index: for every point, the indices of the inequalities it satisfies exactly i.e = 0
+    P = point_array(points, inequalities)
+    tight = [list() for _ in range(len(P))]
+    A, b = inequality_matrix(inequalities, P.shape[1], constant_first)
+    for start in range(0, len(A), BLOCK_SIZE):
+        rows, cols = np.nonzero(A[start:start+BLOCK_SIZE] @ P.T + b[start:start+BLOCK_SIZE, None] == 0)
+        for i, j in zip(rows.tolist(), cols.tolist()):
+            tight[j].append(start+i)
+    return [np.array(t, dtype=np.int64) for t in tight]
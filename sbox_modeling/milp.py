@@ -0,0 +1,375 @@
+import time
+
+import numpy as np
+from sbox_modeling.telemetry import phase, enabled
+
+# Backends tried by "auto", in order
+BACKENDS = ("gurobi", "highs")
+
+# Solve status, the same for every backend
+OPTIMAL = "optimal"
+INFEASIBLE = "infeasible"
+TIME_LIMIT = "time_limit"
+OTHER = "other"
+
+INF = float("inf")
+
+# Seconds spent inside the solvers by this process, see solve_seconds
+_solve_seconds = 0.0
+
+# Thread count the HiGHS scheduler of this process was started with; it is shared by every HiGHS model
+_highs_threads = None
+
+
+def solve_seconds():
+    # Total time spent in optimize / enumerate_solutions by every model of this process
+    return _solve_seconds
+
+
+class Timed:
+    # Adds the time spent in the block to the process total
+    def __enter__(self):
+        self.start = time.time()
+
+    def __exit__(self, *exc):
+        global _solve_seconds
+        _solve_seconds += time.time() - self.start
+
+
+class Model:
+    # Thin MILP model shared by the scripts. Variables are referred to by their column index, every
+    # constraint is a row lb <= sum(coeffs[i] * x[cols[i]]) <= ub. Subclasses wrap one solver each.
+    def __init__(self, threads=None, time_limit=None, verbose=True):
+        self.threads = threads
+        self.time_limit = time_limit
+        self.verbose = verbose
+        self.num_vars = 0
+
+    def add_vars(self, count, lb=0, ub=INF, integer=True, name="x"):
+        # Returns the column indices of the new variables
+        start = self.num_vars
+        self.num_vars += count
+        lb = np.broadcast_to(np.asarray(lb, dtype=float), count)
+        ub = np.broadcast_to(np.asarray(ub, dtype=float), count)
+        self._add_vars(count, lb, ub, integer, name)
+        return np.arange(start, start+count)
+
+    def add_constr(self, cols, coeffs, lb=-INF, ub=INF, name=None):
+        cols = np.asarray(cols, dtype=np.int64)
+        coeffs = np.broadcast_to(np.asarray(coeffs, dtype=float), len(cols))
+        self._add_constr(cols, coeffs, float(lb), float(ub), name)
+
+    def add_constrs(self, cols, coeffs, lb=-INF, ub=INF, name=None, starts=None):
+        # Many rows in one call. Without starts, cols and coeffs are broadcast to one (rows x terms) matrix,
+        # row r being sum(coeffs[r, k] * x[cols[r, k]]); zero coefficients are dropped. With starts, cols and
+        # coeffs are the flat entries of all rows (CSR), row r holding entries starts[r] to starts[r+1].
+        # lb and ub are one bound for all rows or one per row.
+        if starts is None:
+            cols, coeffs = np.broadcast_arrays(np.asarray(cols, dtype=np.int64), np.asarray(coeffs, dtype=float))
+            nonzero = coeffs != 0
+            starts = np.concatenate([[0], np.cumsum(nonzero.sum(axis=1))])
+            cols, coeffs = cols[nonzero], coeffs[nonzero]
+        starts = np.asarray(starts, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        coeffs = np.broadcast_to(np.asarray(coeffs, dtype=float), len(cols))
+        count = len(starts) - 1
+        lb = np.broadcast_to(np.asarray(lb, dtype=float), count)
+        ub = np.broadcast_to(np.asarray(ub, dtype=float), count)
+        if count > 0:
+            self._add_constrs(starts, cols, coeffs, lb, ub, name)
+
+    def _add_constrs(self, starts, cols, coeffs, lb, ub, name):
+        # Row by row, for backends without a bulk call
+        for r in range(len(starts) - 1):
+            k = slice(starts[r], starts[r+1])
+            self._add_constr(cols[k], coeffs[k], float(lb[r]), float(ub[r]), name and f"{name}_{r}")
+
+    def set_objective(self, cols, coeffs, maximize=False):
+        cols = np.asarray(cols, dtype=np.int64)
+        coeffs = np.broadcast_to(np.asarray(coeffs, dtype=float), len(cols))
+        self._set_objective(cols, coeffs, maximize)
+
+    def set_bounds(self, cols, lb, ub):
+        cols = np.asarray(cols, dtype=np.int64)
+        lb = np.broadcast_to(np.asarray(lb, dtype=float), len(cols))
+        ub = np.broadcast_to(np.asarray(ub, dtype=float), len(cols))
+        self._set_bounds(cols, lb, ub)
+
+    def set_time_limit(self, seconds):
+        # Time limit of the next optimize calls, each of them counted on its own
+        self.time_limit = seconds
+        self._set_time_limit(float(seconds))
+
+    def set_start(self, cols, values):
+        # MIP start for the next optimize
+        cols = np.asarray(cols, dtype=np.int64)
+        values = np.broadcast_to(np.asarray(values, dtype=float), len(cols))
+        self._set_start(cols, values)
+
+    def solve(self, run):
+        # Runs the solver call, counting its time and, with telemetry on, emitting a "milp" phase with stats()
+        with phase("milp") as info:
+            with Timed():
+                run()
+            if enabled():
+                info.update(self.stats())
+
+    def enumerate_solutions(self, cols, on_solution):
+        # Calls on_solution(values of cols) for every solution found. It returns rows
+        # (cols, coeffs, lb, ub) cutting that solution off, and the search goes on until no solution
+        # is left. Here the model is re-solved after each one, GurobiModel adds the rows as lazy
+        # constraints inside a single branch and bound.
+        while True:
+            self.optimize()
+            if self.status != OPTIMAL:
+                break
+            rows = on_solution(self.values(cols))
+            if not rows:
+                break
+            for row in rows:
+                self.add_constr(*row)
+
+
+class GurobiModel(Model):
+    def __init__(self, threads=None, time_limit=None, verbose=True, feasibility_tol=None, params=None):
+        import gurobipy as gp
+        from gurobipy import GRB
+
+        super().__init__(threads, time_limit, verbose)
+        self.gp = gp
+        self.GRB = GRB
+        self.model = gp.Model()
+        self.vars = list()
+        if not verbose:
+            self.model.setParam('OutputFlag', 0)
+        if threads:
+            self.model.setParam('Threads', threads)
+        if time_limit is not None:
+            self.model.setParam('TimeLimit', time_limit)
+        if feasibility_tol is not None:
+            self.model.setParam('FeasibilityTol', feasibility_tol)
+        for key, value in (params or {}).items():
+            self.model.setParam(key, value)
+
+    def _add_vars(self, count, lb, ub, integer, name):
+        vtype = self.GRB.INTEGER if integer else self.GRB.CONTINUOUS
+        new_vars = self.model.addVars(count, lb=lb.tolist(), ub=ub.tolist(), vtype=vtype, name=name)
+        self.vars.extend(new_vars.values())
+
+    def _add_constr(self, cols, coeffs, lb, ub, name):
+        expr = self.gp.LinExpr(coeffs.tolist(), [self.vars[c] for c in cols])
+        name = name or ""
+        if lb == ub:
+            self.model.addLConstr(expr, self.GRB.EQUAL, lb, name=name)
+            return
+        if lb > -INF:
+            self.model.addLConstr(expr, self.GRB.GREATER_EQUAL, lb, name=name)
+        if ub < INF:
+            self.model.addLConstr(expr, self.GRB.LESS_EQUAL, ub, name=name)
+
+    def _add_constrs(self, starts, cols, coeffs, lb, ub, name):
+        # Matrix API: one sparse matrix over all variables per sense, added with addMConstr
+        try:
+            import scipy.sparse as sp
+        except ImportError:
+            return super()._add_constrs(starts, cols, coeffs, lb, ub, name)
+        A = sp.csr_matrix((coeffs, cols, starts), shape=(len(starts)-1, len(self.vars)))
+        x = self.gp.MVar.fromlist(self.vars)
+        GRB = self.GRB
+        equal = lb == ub
+        for sense, rows, rhs in ((GRB.EQUAL, equal, lb), (GRB.GREATER_EQUAL, ~equal & (lb > -INF), lb), (GRB.LESS_EQUAL, ~equal & (ub < INF), ub)):
+            if rows.any():
+                self.model.addMConstr(A[rows], x, sense, rhs[rows], name=name or "")
+
+    def _set_objective(self, cols, coeffs, maximize):
+        expr = self.gp.LinExpr(coeffs.tolist(), [self.vars[c] for c in cols])
+        self.model.setObjective(expr, self.GRB.MAXIMIZE if maximize else self.GRB.MINIMIZE)
+
+    def _set_bounds(self, cols, lb, ub):
+        selected = [self.vars[c] for c in cols]
+        self.model.setAttr('LB', selected, lb.tolist())
+        self.model.setAttr('UB', selected, ub.tolist())
+
+    def _set_start(self, cols, values):
+        self.model.setAttr('Start', [self.vars[c] for c in cols], values.tolist())
+
+    def _set_time_limit(self, seconds):
+        self.model.setParam('TimeLimit', seconds)
+
+    def optimize(self):
+        self.solve(self.model.optimize)
+
+    def enumerate_solutions(self, cols, on_solution):
+        GRB = self.GRB
+        watched = [self.vars[c] for c in cols]
+        self.model.setParam('LazyConstraints', 1)
+
+        def callback(model, where):
+            if where != GRB.Callback.MIPSOL:
+                return
+            rows = on_solution(np.array(model.cbGetSolution(watched)))
+            for row_cols, coeffs, lb, ub in rows or ():
+                coeffs = np.broadcast_to(np.asarray(coeffs, dtype=float), len(row_cols))
+                expr = self.gp.LinExpr(coeffs.tolist(), [self.vars[c] for c in row_cols])
+                if lb > -INF:
+                    model.cbLazy(expr >= lb)
+                if ub < INF:
+                    model.cbLazy(expr <= ub)
+
+        self.solve(lambda: self.model.optimize(callback))
+
+    @property
+    def status(self):
+        status = self.model.Status
+        if status == self.GRB.OPTIMAL:
+            return OPTIMAL
+        if status == self.GRB.INFEASIBLE:
+            return INFEASIBLE
+        if status == self.GRB.TIME_LIMIT:
+            return TIME_LIMIT
+        return OTHER
+
+    @property
+    def has_solution(self):
+        return self.model.SolCount > 0
+
+    @property
+    def objective(self):
+        return self.model.ObjVal
+
+    @property
+    def bound(self):
+        return self.model.ObjBound
+
+    def stats(self):
+        m = self.model
+        return {"backend": "gurobi", "status": self.status, "vars": m.NumVars, "rows": m.NumConstrs, "nonzeros": m.NumNZs,
+                "nodes": m.NodeCount if m.IsMIP else 0, "gap": m.MIPGap if m.IsMIP and m.SolCount else None}
+
+    def values(self, cols):
+        # One bulk attribute query instead of one .X per variable
+        return np.array(self.model.getAttr('X', [self.vars[c] for c in cols]))
+
+    def write(self, path):
+        self.model.write(path)
+
+    def dispose(self):
+        self.model.dispose()
+
+
+class HighsModel(Model):
+    def __init__(self, threads=None, time_limit=None, verbose=True, feasibility_tol=None, params=None):
+        import highspy
+
+        super().__init__(threads, time_limit, verbose)
+        self.highspy = highspy
+        self.h = highspy.Highs()
+        self.integer_cols = list()
+        self.start = None
+        self.h.setOptionValue("output_flag", bool(verbose))
+        if threads:
+            self.h.setOptionValue("threads", int(threads))
+        if time_limit is not None:
+            self.h.setOptionValue("time_limit", float(time_limit))
+        if feasibility_tol is not None:
+            self.h.setOptionValue("primal_feasibility_tolerance", float(feasibility_tol))
+            self.h.setOptionValue("mip_feasibility_tolerance", float(feasibility_tol))
+        for key, value in (params or {}).items():
+            self.h.setOptionValue(key, value)
+
+    def _add_vars(self, count, lb, ub, integer, name):
+        self.h.addVars(count, np.ascontiguousarray(lb), np.ascontiguousarray(ub))
+        if integer:
+            cols = np.arange(self.num_vars-count, self.num_vars, dtype=np.int32)
+            kinds = np.full(count, self.highspy.HighsVarType.kInteger)
+            self.h.changeColsIntegrality(count, cols, kinds)
+
+    def _add_constr(self, cols, coeffs, lb, ub, name):
+        self.h.addRow(lb, ub, len(cols), cols.astype(np.int32), np.ascontiguousarray(coeffs))
+
+    def _add_constrs(self, starts, cols, coeffs, lb, ub, name):
+        self.h.addRows(len(starts)-1, np.ascontiguousarray(lb), np.ascontiguousarray(ub), len(cols),
+                       starts[:-1].astype(np.int32), cols.astype(np.int32), np.ascontiguousarray(coeffs))
+
+    def _set_objective(self, cols, coeffs, maximize):
+        self.h.changeColsCost(self.num_vars, np.arange(self.num_vars, dtype=np.int32), np.zeros(self.num_vars))
+        self.h.changeColsCost(len(cols), cols.astype(np.int32), np.ascontiguousarray(coeffs))
+        sense = self.highspy.ObjSense.kMaximize if maximize else self.highspy.ObjSense.kMinimize
+        self.h.changeObjectiveSense(sense)
+
+    def _set_bounds(self, cols, lb, ub):
+        self.h.changeColsBounds(len(cols), cols.astype(np.int32), np.ascontiguousarray(lb), np.ascontiguousarray(ub))
+
+    def _set_start(self, cols, values):
+        if self.start is None or len(self.start) != self.num_vars:
+            self.start = np.zeros(self.num_vars)
+        self.start[cols] = values
+
+    def _set_time_limit(self, seconds):
+        self.h.setOptionValue("time_limit", seconds)
+
+    def optimize(self):
+        # The scheduler keeps the thread count of the first solve, restart it when another count is asked for
+        global _highs_threads
+        if _highs_threads is not None and _highs_threads != self.threads:
+            self.highspy.Highs.resetGlobalScheduler(True)
+        _highs_threads = self.threads
+        if self.start is not None:
+            solution = self.highspy.HighsSolution()
+            solution.col_value = self.start.tolist()
+            self.h.setSolution(solution)
+        self.solve(self.h.run)
+
+    @property
+    def status(self):
+        status = self.h.getModelStatus()
+        if status == self.highspy.HighsModelStatus.kOptimal:
+            return OPTIMAL
+        if status == self.highspy.HighsModelStatus.kInfeasible:
+            return INFEASIBLE
+        if status == self.highspy.HighsModelStatus.kTimeLimit:
+            return TIME_LIMIT
+        return OTHER
+
+    @property
+    def has_solution(self):
+        return self.h.getInfo().primal_solution_status == 2
+
+    @property
+    def objective(self):
+        return self.h.getInfo().objective_function_value
+
+    @property
+    def bound(self):
+        return self.h.getInfo().mip_dual_bound
+
+    def stats(self):
+        info = self.h.getInfo()
+        return {"backend": "highs", "status": self.status, "vars": self.h.getNumCol(), "rows": self.h.getNumRow(),
+                "nonzeros": self.h.getNumNz(), "nodes": info.mip_node_count, "gap": info.mip_gap}
+
+    def values(self, cols):
+        return np.asarray(self.h.getSolution().col_value)[np.asarray(cols, dtype=np.int64)]
+
+    def write(self, path):
+        self.h.writeModel(path)
+
+    def dispose(self):
+        self.h.clear()
+
+
+def create_model(backend="auto", threads=None, time_limit=None, verbose=True, feasibility_tol=None, params=None):
+    # New empty model on the given backend: "gurobi", "highs" or "auto" (Gurobi when it can be imported).
+    # params are passed to the solver unchanged, so their names are backend specific.
+    if backend == "auto":
+        for name in BACKENDS:
+            try:
+                return create_model(name, threads, time_limit, verbose, feasibility_tol, params)
+            except ImportError:
+                continue
+        raise ImportError(f"no MILP backend available, install one of {BACKENDS}")
+    if backend == "gurobi":
+        return GurobiModel(threads, time_limit, verbose, feasibility_tol, params)
+    if backend == "highs":
+        return HighsModel(threads, time_limit, verbose, feasibility_tol, params)
+    raise ValueError(f"unknown MILP backend {backend!r}, expected 'auto' or one of {BACKENDS}")
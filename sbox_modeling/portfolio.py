@@ -0,0 +1,103 @@
+import multiprocessing
+import time
+from multiprocessing.connection import wait
+
+from sbox_modeling.telemetry import emit
+
+# No configuration has finished yet
+NO_INCUMBENT = 2**31 - 1
+
+
+class Race:
+    # State shared by the configurations of one portfolio: the smallest model size finished so far,
+    # the size every configuration has reached, and the wall-clock deadline (time.time()).
+    # A configuration calls can_win with its current size before each step and gives up when it is False.
+    # Both are raw shared memory without a lock, since a process may be terminated at any point: best is
+    # only written by the parent, and every slot of progress only by its own configuration.
+    def __init__(self, ctx, configurations, deadline):
+        self.best = ctx.RawValue('i', NO_INCUMBENT)
+        self.progress = ctx.RawArray('i', configurations)
+        self.deadline = deadline
+        self.index = None
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.time())
+
+    def can_win(self, count, more=1):
+        # A configuration holding count items that still needs at least `more` can only end strictly
+        # below the incumbent if count + more < best, and only before the deadline
+        if self.index is not None:
+            self.progress[self.index] = count
+        return count + more < self.best.value and time.time() < self.deadline
+
+
+def race_worker(worker, configuration, threads, race, index, sender):
+    # One configuration in its own process. worker returns the finished model (a list) or None when it gave up.
+    # Every process has a pipe of its own, so stopping one never leaves a shared queue locked
+    race.index = index
+    start = time.time()
+    try:
+        model = worker(configuration, threads, race)
+        sender.send((model, None, time.time() - start))
+    except Exception as error:
+        sender.send((None, repr(error), time.time() - start))
+
+
+def run_portfolio(worker, configurations, total_threads, budget):
+    # Runs worker(configuration, threads, race) for every configuration at once, each in its own process
+    # with an equal share of the threads, for at most budget seconds. Configurations that can no longer
+    # beat the incumbent are stopped. Returns (best index or None, records) with one record
+    # {"model", "error", "seconds", "status"} per configuration, status "best", "finished",
+    # "aborted", "failed" or "timeout".
+    ctx = multiprocessing.get_context("spawn")
+    threads = max(1, (total_threads or 1) // len(configurations))
+    race = Race(ctx, len(configurations), time.time() + budget)
+    jobs, receivers = list(), list()
+    for i, configuration in enumerate(configurations):
+        receiver, sender = ctx.Pipe(duplex=False)
+        jobs.append(ctx.Process(target=race_worker, args=(worker, configuration, threads, race, i, sender)))
+        receivers.append(receiver)
+        jobs[-1].start()
+        sender.close()
+
+    records = [None] * len(configurations)
+    best = None
+    running = set(range(len(configurations)))
+    while running and race.remaining() > 0:
+        ready = wait([receivers[i] for i in running], timeout=race.remaining())
+        if not ready:
+            break
+        index = receivers.index(ready[0])
+        running.discard(index)
+        try:
+            model, error, seconds = receivers[index].recv()
+        except EOFError:
+            jobs[index].join()
+            model, error, seconds = None, f"exit code {jobs[index].exitcode}", None
+        if error is not None:
+            status = "failed"
+        elif model is None:
+            status = "aborted"
+        else:
+            status = "finished"
+            if best is None or len(model) < len(records[best]["model"]):
+                best = index
+                race.best.value = len(model)
+        records[index] = {"model": model, "error": error, "seconds": seconds, "status": status}
+        emit("portfolio", configuration=index, status=status, seconds=seconds, size=None if model is None else len(model))
+
+        # Stop the configurations already too far behind the new incumbent instead of waiting for their next step
+        for i in list(running):
+            if race.progress[i] + 1 >= race.best.value:
+                jobs[i].terminate()
+                running.discard(i)
+                records[i] = {"model": None, "error": None, "seconds": None, "status": "aborted"}
+
+    for i in running:
+        jobs[i].terminate()
+        records[i] = {"model": None, "error": None, "seconds": budget, "status": "timeout"}
+    for job in jobs:
+        job.join()
+    if best is not None:
+        records[best]["status"] = "best"
+    return best, records
@@ -0,0 +1,80 @@
+import numpy as np
+from sbox_modeling.kernel import CutMatrix
+from sbox_modeling.dominance import prune_dominated
+
+# Upper bound on the entries of one block of the row containment product
+BLOCK_ENTRIES = 1 << 24
+
+
+def minimal_rows(X):
+    # Indices of the rows of X (points x inequalities) whose column set contains no other row's set.
+    # Covering such a row covers every row containing it, so the others can be dropped; of equal rows
+    # only the first is kept
+    m = len(X)
+    if m == 0:
+        return np.zeros(0, dtype=np.int64)
+    F = X.astype(np.float32)
+    sizes = X.sum(axis=1)
+    redundant = np.zeros(m, dtype=bool)
+    step = max(1, BLOCK_ENTRIES // max(1, X.shape[1]))
+    for start in range(0, m, step):
+        # common[r, s] = |cols(r) & cols(s)|, so r is contained in s when it equals |cols(r)|
+        common = F[start:start+step] @ F.T
+        inside = common == sizes[start:start+step, None]
+        rows = np.arange(start, min(start+step, m))
+        equal = inside & (sizes[start:start+step, None] == sizes[None, :])
+        # A strict subset makes s redundant; of equal rows the later one goes
+        strict = inside & ~equal
+        later = equal & (rows[:, None] < np.arange(m)[None, :])
+        redundant |= (strict | later).any(axis=0)
+    return np.flatnonzero(~redundant)
+
+
+def presolve_cover(cuts):
+    # Reduces the unit-cost set cover "pick the fewest inequalities cutting every point" given as the
+    # (inequalities x points) cut matrix. Repeats until nothing changes:
+    #   - a point cut by a single inequality makes that inequality essential: it is fixed and its points removed
+    #   - an inequality whose remaining cut set is empty, equal to or contained in another's is dropped
+    #   - a point whose set of cutting inequalities contains another point's set is dropped
+    # Returns (fixed, columns, rows, uncovered): the fixed inequalities, the inequalities and points of the
+    # reduced problem (all as indices into cuts) and the points no inequality cuts.
+    # An optimal cover of cuts[columns][:, rows] plus fixed is an optimal cover of every coverable point.
+    if isinstance(cuts, CutMatrix):
+        cuts = cuts.to_bool()
+    X = np.asarray(cuts, dtype=bool).T
+    uncovered = np.flatnonzero(~X.any(axis=1))
+    rows = np.flatnonzero(X.any(axis=1))
+    columns = np.arange(X.shape[1])
+    fixed = list()
+
+    while len(rows):
+        size = (len(rows), len(columns))
+        sub = X[np.ix_(rows, columns)]
+
+        # Essential inequalities
+        single = sub.sum(axis=1) == 1
+        if single.any():
+            essential = np.unique(sub[single].argmax(axis=1))
+            fixed.extend(columns[essential].tolist())
+            covered = sub[:, essential].any(axis=1)
+            rows = rows[~covered]
+            columns = np.delete(columns, essential)
+            if len(rows) == 0:
+                break
+            sub = X[np.ix_(rows, columns)]
+
+        # Dominated and duplicate inequalities
+        keep = prune_dominated(sub.T)
+        columns = columns[keep]
+        sub = sub[:, keep]
+
+        # Dominated and duplicate points
+        keep = minimal_rows(sub)
+        rows = rows[keep]
+
+        if (len(rows), len(columns)) == size:
+            break
+
+    if len(rows) == 0:
+        columns = columns[:0]
+    return np.array(sorted(fixed), dtype=np.int64), columns, rows, uncovered
@@ -0,0 +1,156 @@
+import fcntl
+import os
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+from sbox_modeling.cache import compact_int_dtype
+from sbox_modeling.verify import read_inequalities
+
+# Bump when the layout of the store files changes
+STORE_VERSION = 1
+
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "results_store")
+
+# The text results of the repository: directory, method, variant of every file name suffix, and whether
+# the inequalities put the constant first (convex hull outputs) or last (MILP outputs)
+TEXT_RESULTS = [
+    ("Direct Inequality Generation/4-bit_sboxes_256_256", "direct", {"": "256_256"}, False),
+    ("Direct Inequality Generation/4-bit_sboxes_500_500", "direct", {"": "500_500"}, False),
+    ("Greedy Generation and Reduction/Results", "greedy", {"": ""}, False),
+    ("Modified Greedy Approach/Results", "modified", {"_first": "first", "_last": "last", "_mid": "mid", "_rand": "rand"}, True),
+    ("Iterative Inequality Augmentation/4-bit_sboxes", "iterative", {"_improved_MILP": ""}, True),
+    ("Iterative Inequality Augmentation/5-bit_sboxes", "iterative", {"_improved_MILP": ""}, True),
+]
+
+
+def text_result_files(root, directory, suffixes):
+    # (S box name, suffix, path) of every result file of a directory
+    files = list()
+    path = os.path.join(root, directory)
+    if not os.path.isdir(path):
+        return files
+    for file_name in sorted(os.listdir(path)):
+        if not file_name.endswith(".txt"):
+            continue
+        stem = file_name[:-4]
+        # Longest suffix first, so "" only matches when no other one does
+        for suffix in sorted(suffixes, key=len, reverse=True):
+            if stem.endswith(suffix) and len(stem) > len(suffix):
+                files.append((stem[:len(stem)-len(suffix)], suffix, os.path.join(path, file_name)))
+                break
+    return files
+
+
+def constant_first_matrix(inequalities, constant_first=True):
+    # Inequalities as an int64 matrix with the constant in column 0, the layout of the store
+    if len(inequalities) == 0:
+        # Keep the width of an empty matrix; a plain empty list has none
+        return np.zeros((0, np.shape(inequalities)[1] if np.ndim(inequalities) == 2 else 0), dtype=np.int64)
+    Q = np.array([[int(c) for c in q] for q in inequalities], dtype=np.int64)
+    if constant_first:
+        return Q
+    return np.column_stack([Q[:, -1], Q[:, :-1]])
+
+
+class MethodResults:
+    # All inequality systems of one method, indexed by (S box, table type, variant).
+    # variant tells apart the runs of one S box: the bounds of the Direct Inequality Generation ("500_500")
+    # or the tie-break policy of the Modified Greedy Approach ("first"); "" when there is only one.
+    def __init__(self, data=None, offsets=None, widths=None, keys=None):
+        self.data = np.zeros(0, dtype=np.int8) if data is None else data
+        self.offsets = np.zeros(1, dtype=np.int64) if offsets is None else offsets
+        self.widths = np.zeros(0, dtype=np.int64) if widths is None else widths
+        self.keys = list() if keys is None else keys
+        self.index = {key: i for i, key in enumerate(self.keys)}
+
+    def get(self, sbox, table_type="DDT", variant=""):
+        # (inequalities x n+1) matrix, constant first; None when the system is not stored
+        i = self.index.get((sbox, table_type, variant))
+        if i is None:
+            return None
+        # An empty system given without its width (e.g. put with []) is stored with width 0
+        width = int(self.widths[i])
+        return self.data[self.offsets[i]:self.offsets[i+1]].reshape(-1 if width else 0, width)
+
+    def systems(self):
+        for i, key in enumerate(self.keys):
+            yield key, self.get(*key)
+
+    def with_systems(self, entries):
+        # New MethodResults holding these plus the entries {(sbox, table_type, variant): matrix};
+        # an entry replaces a stored system with the same key
+        systems = dict(self.systems())
+        systems.update(entries)
+        keys = list(systems)
+        blocks = [np.asarray(systems[key], dtype=np.int64).reshape(-1) for key in keys]
+        data = np.concatenate([np.zeros(0, dtype=np.int64)] + blocks)
+        offsets = np.concatenate([[0], np.cumsum([len(b) for b in blocks])]).astype(np.int64)
+        widths = np.array([np.shape(systems[key])[1] if np.ndim(systems[key]) == 2 else 0 for key in keys], dtype=np.int64)
+        return MethodResults(data.astype(compact_int_dtype(data)), offsets, widths, keys)
+
+
+class ResultStore:
+    # Versioned binary store of inequality systems, one .npz file per method (see MethodResults).
+    # Files go to results_store/ at the repository root unless SBOX_RESULTS_DIR is set. Writers of one
+    # method take a lock, so the processes of a batch can add their results concurrently.
+    def __init__(self, directory=None):
+        self.directory = directory or os.environ.get("SBOX_RESULTS_DIR", DEFAULT_STORE_DIR)
+
+    def path(self, method):
+        return os.path.join(self.directory, f"{method}.npz")
+
+    def load(self, method):
+        path = self.path(method)
+        if not os.path.exists(path):
+            return MethodResults()
+        with np.load(path) as f:
+            if int(f["version"]) != STORE_VERSION:
+                raise ValueError(f"{path}: store version {int(f['version'])}, expected {STORE_VERSION}")
+            keys = list(zip(f["sbox"].tolist(), f["table_type"].tolist(), f["variant"].tolist()))
+            return MethodResults(f["data"], f["offsets"], f["widths"], keys)
+
+    @contextmanager
+    def locked(self, method):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, f".{method}.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def save(self, method, results):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp_", suffix=".npz")
+        keys = results.keys
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, version=STORE_VERSION, data=results.data, offsets=results.offsets, widths=results.widths,
+                         sbox=np.array([k[0] for k in keys], dtype=str), table_type=np.array([k[1] for k in keys], dtype=str),
+                         variant=np.array([k[2] for k in keys], dtype=str))
+            os.replace(tmp_path, self.path(method))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def put_many(self, method, entries):
+        # Adds or replaces several systems {(sbox, table_type, variant): constant-first matrix} of a method
+        with self.locked(method):
+            self.save(method, self.load(method).with_systems(entries))
+
+    def put(self, method, sbox, inequalities, table_type="DDT", variant="", constant_first=True):
+        self.put_many(method, {(sbox, table_type, variant): constant_first_matrix(inequalities, constant_first)})
+
+
+def import_text_results(root, store):
+    # Reads every text result file of the repository (see TEXT_RESULTS) into the store, all in the
+    # constant-first layout. Returns the number of systems imported per method.
+    imported = dict()
+    for directory, method, variants, constant_first in TEXT_RESULTS:
+        entries = dict()
+        for sbox, suffix, path in text_result_files(root, directory, variants):
+            entries[(sbox, "DDT", variants[suffix])] = constant_first_matrix(read_inequalities(path), constant_first)
+        if entries:
+            store.put_many(method, entries)
+            imported[method] = imported.get(method, 0) + len(entries)
+    return imported
@@ -0,0 +1,58 @@
+import numpy as np
+
+# Upper bound on the entries of one (impossible points x possible points) difference block
+BLOCK_ENTRIES = 1 << 24
+
+
+def free_masks(possible, impossible, n, order):
+    # For every impossible point v, a maximal set F of coordinates (bitmask) such that the subcube
+    # {x : x agrees with v outside F} holds no possible point. Coordinates are freed one by one in the
+    # given order (bit positions, 0 = least significant), each as long as the subcube stays impossible.
+    # Only the differences p ^ v restricted to the fixed coordinates are kept: freeing bit i is blocked
+    # exactly when some possible point differs from v in bit i alone.
+    # The narrowest unsigned type holding n bits keeps the difference blocks small
+    dtype = np.uint16 if n <= 16 else np.uint32 if n <= 32 else np.uint64
+    possible = np.asarray(possible).astype(dtype)
+    impossible = np.asarray(impossible).astype(dtype)
+    masks = np.zeros(len(impossible), dtype=np.int64)
+    step = max(1, BLOCK_ENTRIES // max(1, len(possible)))
+    for start in range(0, len(impossible), step):
+        rest = impossible[start:start+step, None] ^ possible[None, :]
+        free = np.zeros(len(rest), dtype=np.int64)
+        for i in order:
+            bit = dtype(1 << int(i))
+            ok = ~(rest == bit).any(axis=1)
+            free[ok] |= int(bit)
+            rest[ok] &= ~bit
+        masks[start:start+step] = free
+    return masks
+
+
+def subcube_inequalities(impossible, masks, n):
+    # Inequality cutting exactly the subcube of v with free coordinates F, constant first:
+    #   sum_{i fixed, v_i = 1} (1 - x_i) + sum_{i fixed, v_i = 0} x_i >= 1
+    # Coordinates are MSB first as in point_matrix
+    shifts = np.arange(n-1, -1, -1, dtype=np.int64)
+    bits = (np.asarray(impossible, dtype=np.int64)[:, None] >> shifts) & 1
+    fixed = ((np.asarray(masks, dtype=np.int64)[:, None] >> shifts) & 1) == 0
+    a = np.where(fixed, 1 - 2*bits, 0)
+    b = (fixed & (bits == 1)).sum(axis=1) - 1
+    return np.column_stack([b, a]).astype(np.int64)
+
+
+def subcube_candidates(possible, impossible, n, rounds=4, seed=None):
+    # Candidate inequalities for wide S boxes without a convex hull: for every impossible transition the
+    # largest impossible subcubes around it, one per coordinate order (the natural order first, then
+    # random ones), deduplicated. Every candidate is valid for the possible transitions by construction.
+    # possible and impossible are integer arrays of transitions. Returns an int matrix (candidates x n+1),
+    # constant first.
+    rng = np.random.default_rng(seed)
+    impossible = np.asarray(impossible, dtype=np.int64)
+    keys = list()
+    for r in range(rounds):
+        order = np.arange(n) if r == 0 else rng.permutation(n)
+        masks = free_masks(possible, impossible, n, order)
+        # A subcube is identified by its free mask and the fixed values
+        keys.append(np.column_stack([masks, impossible & ~masks]))
+    keys = np.unique(np.concatenate(keys), axis=0)
+    return subcube_inequalities(keys[:, 1], keys[:, 0], n)
@@ -0,0 +1,102 @@
+import numpy as np
+from sbox_modeling.kernel import cut_matrix
+
+# Enumeration stops after this many symmetries; a partial list still only yields valid inequalities
+MAX_GROUP_SIZE = 1024
+
+
+def point_ids(points):
+    # Rows of a 0/1 matrix (MSB first) to integers
+    points = np.asarray(points, dtype=np.int64)
+    weights = 1 << np.arange(points.shape[1]-1, -1, -1, dtype=np.int64)
+    return points @ weights
+
+
+def symmetry_group(points, max_size=MAX_GROUP_SIZE):
+    # Maps g(x) = perm(x) XOR t of the n-bit cube sending the point set onto itself, where perm moves
+    # bit i of x to position perm[i] (MSB-first positions, as in point_matrix).
+    # For each translation t the permutations are found by backtracking on the counts of points
+    # having one bit / two bits set, which have closed forms for the translated set.
+    # Returns a list of (perm, t) pairs of int arrays, identity first.
+    P = np.asarray(points, dtype=np.int64)
+    m, n = P.shape
+    member = np.zeros(1 << n, dtype=bool)
+    member[point_ids(P)] = True
+    c = P.sum(axis=0)
+    C = P.T @ P
+
+    # Translations whose single bit counts are a permutation of the original ones
+    T = (np.arange(1 << n)[:, None] >> np.arange(n-1, -1, -1)[None, :]) & 1
+    counts = np.where(T == 1, m - c[None, :], c[None, :])
+    T = T[(np.sort(counts, axis=1) == np.sort(c)[None, :]).all(axis=1)]
+
+    group = list()
+    for t in T:
+        # Pair counts of the translated set P XOR t
+        ti, tj = t[:, None], t[None, :]
+        Ct = np.where(ti & tj, m - c[:, None] - c[None, :] + C,
+             np.where(ti, c[None, :] - C, np.where(tj, c[:, None] - C, C)))
+        np.fill_diagonal(Ct, np.where(t == 1, m - c, c))
+
+        perm = np.full(n, -1, dtype=np.int64)
+        used = np.zeros(n, dtype=bool)
+
+        def extend(i):
+            if i == n:
+                Y = np.zeros_like(P)
+                Y[:, perm] = P
+                if member[point_ids(Y ^ t[None, :])].all():
+                    group.append((perm.copy(), t.copy()))
+                return len(group) >= max_size
+            for j in range(n):
+                if used[j] or Ct[j, j] != C[i, i]:
+                    continue
+                if (Ct[perm[:i], j] != C[:i, i]).any():
+                    continue
+                perm[i] = j
+                used[j] = True
+                done = extend(i+1)
+                used[j] = False
+                perm[i] = -1
+                if done:
+                    return True
+            return False
+
+        if extend(0):
+            break
+
+    # Identity first
+    identity = [k for k, (perm, t) in enumerate(group) if (perm == np.arange(n)).all() and not t.any()]
+    if identity:
+        group.insert(0, group.pop(identity[0]))
+    return group
+
+
+def transform(inequality, perm, t, constant_first=True):
+    # Image of a*x + b >= 0 under g(x) = perm(x) XOR t: the inequality a'*g(x) + b' = a*x + b
+    ineq = np.asarray(inequality, dtype=np.int64)
+    b, a = (ineq[0], ineq[1:]) if constant_first else (ineq[-1], ineq[:-1])
+    flipped = t[perm] == 1
+    new_a = np.zeros_like(a)
+    new_a[perm] = np.where(flipped, -a, a)
+    new_b = b + a[flipped].sum()
+    if constant_first:
+        return (int(new_b),) + tuple(new_a.tolist())
+    return tuple(new_a.tolist()) + (int(new_b),)
+
+
+def orbit(inequality, group, constant_first=True):
+    # Distinct images of an inequality under the group, the inequality itself first
+    seen = dict()
+    for perm, t in group:
+        image = transform(inequality, perm, t, constant_first)
+        seen.setdefault(image, None)
+    return list(seen)
+
+
+def orbit_cuts(inequality, group, points, constant_first=True):
+    # The other images of an inequality and the (images x points) bool matrix of the points each one cuts
+    images = orbit(inequality, group, constant_first)[1:]
+    if not images or len(points) == 0:
+        return images, np.zeros((len(images), len(points)), dtype=bool)
+    return images, cut_matrix(images, points, constant_first).to_bool()
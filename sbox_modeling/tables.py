@@ -0,0 +1,153 @@
+import numpy as np
+from sbox_modeling.telemetry import phase
+
+
+def get_sbox(raw_sbox):
+    # Name of the S box
+    name = raw_sbox["name"]
+
+    # Input and output size of the S box
+    input_bit_size = int(raw_sbox["input"])
+    output_bit_size = int(raw_sbox["output"])
+
+    # S box in the form of an integer array
+    s_box = [0]*(2**input_bit_size)
+    for i in raw_sbox["s-box"]:
+        s_box[int(i)] = int(raw_sbox["s-box"][i])
+    return name, input_bit_size, output_bit_size, s_box
+
+
+def gen_DDT(input_bit_size, output_bit_size, s_box):
+    # Generate DDT from the obtained S box
+    # Every pair (p1, p2) is handled at once: row index is p1 ^ p2, column index is S(p1) ^ S(p2)
+    x = np.arange(2**input_bit_size)
+    s = np.asarray(s_box, dtype=np.int64)
+    XOR_IN = x[:, None] ^ x[None, :]
+    XOR_OUT = s[:, None] ^ s[None, :]
+    cells = (XOR_IN << output_bit_size) | XOR_OUT
+    DDT = np.bincount(cells.ravel(), minlength=2**(input_bit_size+output_bit_size))
+    return DDT.reshape(2**input_bit_size, 2**output_bit_size).astype(int)
+
+
+def bit_halves(F, h):
+    # Views of the rows of F whose index has bit h clear / set, paired row by row
+    G = F.reshape(len(F) // (2*h), 2, h, *F.shape[1:])
+    return G[:, 0], G[:, 1]
+
+
+def parity(values, bits):
+    # Parity of the lowest bits of every entry
+    values = np.asarray(values, dtype=np.int64)
+    p = np.zeros_like(values)
+    for i in range(bits):
+        p ^= (values >> i) & 1
+    return p
+
+
+def gen_LAT(input_bit_size, output_bit_size, s_box):
+    # Generate LAT from the obtained S box: LAT[a][b] = #{x : a.x = b.S(x)} - 2^(input_bit_size-1)
+    # Column b is half the Walsh-Hadamard transform of (-1)^(b.S(x)), all columns transformed together
+    s = np.asarray(s_box, dtype=np.int64)
+    b = np.arange(2**output_bit_size)
+    W = 1 - 2*parity(s[:, None] & b[None, :], output_bit_size)
+    h = 1
+    while h < len(W):
+        low, high = bit_halves(W, h)
+        previous = low.copy()
+        low += high
+        np.subtract(previous, high, out=high)
+        h *= 2
+    return (W // 2).astype(int)
+
+
+def gen_BCT(input_bit_size, output_bit_size, s_box):
+    # Generate BCT from the obtained S box:
+    # BCT[a][b] = #{x : S^-1(S(x) ^ b) ^ S^-1(S(x ^ a) ^ b) = a}, only defined for permutations
+    s = np.asarray(s_box, dtype=np.int64)
+    if input_bit_size != output_bit_size or len(np.unique(s)) != len(s):
+        raise ValueError("the BCT needs an invertible S box")
+    inverse = np.argsort(s)
+    x = np.arange(2**input_bit_size)
+    nabla = np.arange(2**output_bit_size)
+    BCT = np.zeros((2**input_bit_size, 2**output_bit_size), dtype=np.int64)
+    # One input difference at a time, every x and every output difference at once
+    for a in range(2**input_bit_size):
+        back = inverse[s[x, None] ^ nabla[None, :]] ^ inverse[s[x ^ a, None] ^ nabla[None, :]]
+        BCT[a] = (back == a).sum(axis=0)
+    return BCT.astype(int)
+
+
+def gen_DPT(input_bit_size, output_bit_size, s_box):
+    # Generate the division property table from the obtained S box: DPT[u][v] = 1 when u -> v is a
+    # division trail with v minimal, i.e. the product of the output bits in v has a monomial covering u
+    # in its ANF, and no smaller v' (bitwise) does.
+    # ANF of every product at once by the Moebius transform, then "a monomial covering u" by a
+    # superset OR over the input bits and minimality by a subset OR over the output bits
+    s = np.asarray(s_box, dtype=np.int64)
+    v = np.arange(2**output_bit_size)
+    A = (s[:, None] & v[None, :]) == v[None, :]
+    h = 1
+    while h < len(A):
+        low, high = bit_halves(A, h)
+        high ^= low
+        h *= 2
+    h = 1
+    while h < len(A):
+        low, high = bit_halves(A, h)
+        low |= high
+        h *= 2
+    # Z[u][v]: some v' contained in v (v itself included) is a trail
+    Z = A.T.copy()
+    h = 1
+    while h < len(Z):
+        low, high = bit_halves(Z, h)
+        high |= low
+        h *= 2
+    Z = Z.T
+    smaller = np.zeros_like(A)
+    for i in range(output_bit_size):
+        has_bit = (v >> i) & 1 == 1
+        smaller[:, has_bit] |= Z[:, v[has_bit] ^ (1 << i)]
+    return (A & ~smaller).astype(int)
+
+
+# Table generators by table type
+TABLE_TYPES = {"DDT": gen_DDT, "LAT": gen_LAT, "BCT": gen_BCT, "DPT": gen_DPT}
+
+
+def gen_table(table_type, input_bit_size, output_bit_size, s_box):
+    if table_type not in TABLE_TYPES:
+        raise ValueError(f"unknown table type {table_type!r}, expected one of {tuple(TABLE_TYPES)}")
+    return TABLE_TYPES[table_type](input_bit_size, output_bit_size, s_box)
+
+
+def get_transitions(input_bit_size, output_bit_size, table):
+    # Get possible and impossible transitions from the table
+    # A transition (i, j) is stored as the integer whose bits are those of i followed by those of j,
+    # so both arrays come out sorted in the same order as a row-major walk over the table.
+    # Any nonzero entry is possible, as LAT entries can be negative
+    flat = np.asarray(table).reshape(2**(input_bit_size+output_bit_size))
+    possible_transitions = np.flatnonzero(flat != 0)
+    impossible_transitions = np.flatnonzero(flat == 0)
+    return possible_transitions, impossible_transitions
+
+
+def point_matrix(transitions, n):
+    # 0/1 matrix with one row per transition, most significant bit first
+    shifts = np.arange(n-1, -1, -1)
+    return ((np.asarray(transitions, dtype=np.int64)[:, None] >> shifts) & 1).astype(np.int8)
+
+
+class SboxTransitions:
+    # Everything the modeling methods need about one S box, computed once for the chosen table
+    # ("DDT", "LAT", "BCT" or "DPT", see TABLE_TYPES)
+    def __init__(self, raw_sbox, table_type="DDT"):
+        self.name, self.input_bit_size, self.output_bit_size, self.s_box = get_sbox(raw_sbox)
+        self.n = self.input_bit_size + self.output_bit_size
+        self.table_type = table_type
+        with phase(f"gen_{table_type}", sbox=self.name) as info:
+            self.table = gen_table(table_type, self.input_bit_size, self.output_bit_size, self.s_box)
+            self.possible, self.impossible = get_transitions(self.input_bit_size, self.output_bit_size, self.table)
+            info.update(possible=len(self.possible), impossible=len(self.impossible))
+        self.possible_points = point_matrix(self.possible, self.n)
+        self.impossible_points = point_matrix(self.impossible, self.n)
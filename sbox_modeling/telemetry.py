@@ -0,0 +1,116 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Events go to the JSON lines file named by this environment variable; unset means telemetry is off.
+# The variable is inherited by pool workers, so every process of a batch appends to the same file
+ENV_VAR = "SBOX_TELEMETRY"
+
+# Fields added to every event of this process, see set_context
+_context = dict()
+
+
+def enable(path):
+    # Start recording to path (appended to, one JSON object per line). None changes nothing, so a run
+    # started with SBOX_TELEMETRY set keeps recording there
+    if path is not None:
+        os.environ[ENV_VAR] = os.path.abspath(path)
+
+
+def enabled():
+    return bool(os.environ.get(ENV_VAR))
+
+
+def event_file():
+    # File the events of this process go to, None when telemetry is off
+    return os.environ.get(ENV_VAR) or None
+
+
+def set_context(**fields):
+    # Fields such as the S box name, added to every later event of this process
+    _context.clear()
+    _context.update(fields)
+
+
+def clean(value):
+    # JSON has no inf / nan, and NumPy scalars are not serializable
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def emit(event, **fields):
+    # Appends one event; a single short write per line keeps lines from concurrent processes whole
+    path = os.environ.get(ENV_VAR)
+    if not path:
+        return
+    record = {"event": event, "time": time.time(), "pid": os.getpid(), "tid": threading.get_ident()}
+    record.update(_context)
+    record.update({key: clean(value) for key, value in fields.items()})
+    with open(path, "a") as f:
+        f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+
+@contextmanager
+def phase(name, **fields):
+    # Times the block and emits one "phase" event with its start and duration in seconds.
+    # Yields a dict the block can fill with counts (candidates, sizes, ...), sent along with the timing
+    info = dict(fields)
+    start = time.time()
+    try:
+        yield info
+    finally:
+        if enabled():
+            emit("phase", name=name, start=start, seconds=time.time() - start, **info)
+
+
+def read_events(path):
+    events = list()
+    with open(path) as f:
+        for line in f:
+            if line.endswith("\n"):
+                events.append(json.loads(line))
+    return events
+
+
+def phase_totals(events):
+    # {((sbox, method), phase name): [calls, seconds]}; nested phases are counted inside their parents too
+    totals = defaultdict(lambda: [0, 0.0])
+    for e in events:
+        if e["event"] == "phase":
+            entry = totals[((e.get("sbox"), e.get("method")), e["name"])]
+            entry[0] += 1
+            entry[1] += e["seconds"]
+    return dict(totals)
+
+
+def summarize(path):
+    # Per S box and method, the time of every phase, slowest first
+    totals = phase_totals(read_events(path))
+    for run in sorted({key[0] for key in totals}, key=str):
+        print(f"{run[0]} ({run[1]})")
+        rows = sorted(((name, calls, seconds) for (r, name), (calls, seconds) in totals.items() if r == run), key=lambda r: -r[2])
+        for name, calls, seconds in rows:
+            print(f"  {name:<24}{calls:>8}{seconds:>12.3f} s")
+
+
+def write_chrome_trace(path, trace_path):
+    # Chrome trace (chrome://tracing, Perfetto) of an event file: phases become complete events on the
+    # thread that ran them, everything else an instant event; the other fields are the event's args
+    trace = list()
+    for e in read_events(path):
+        args = {key: value for key, value in e.items() if key not in ("event", "time", "pid", "tid", "name", "start", "seconds")}
+        if e["event"] == "phase":
+            trace.append({"name": e["name"], "cat": "phase", "ph": "X", "ts": e["start"] * 1e6, "dur": e["seconds"] * 1e6,
+                          "pid": e["pid"], "tid": e["tid"], "args": args})
+        else:
+            trace.append({"name": e.get("name", e["event"]), "cat": e["event"], "ph": "i", "s": "t", "ts": e["time"] * 1e6,
+                          "pid": e["pid"], "tid": e["tid"], "args": args})
+    with open(trace_path, "w") as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
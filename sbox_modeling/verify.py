@@ -0,0 +1,74 @@
+import json
+
+import numpy as np
+from sbox_modeling.kernel import cut_matrix
+
+
+def read_inequalities(path):
+    # Inequalities of a result file: every line starting with '[' is one, other lines are notes
+    inequalities = list()
+    with open(path) as f:
+        for line in f:
+            if line.startswith('['):
+                inequalities.append(json.loads(line))
+    return inequalities
+
+
+def diagnose(possible_cuts, impossible_cuts, sbox):
+    # Report for one model from its bool cut matrices over the possible and impossible points
+    # (inequalities x points), see verify
+    cover_count = impossible_cuts.sum(axis=0)
+    wrong_ineq, wrong_point = np.nonzero(possible_cuts)
+    # An inequality is redundant when every point it cuts is also cut by another one
+    redundant = ~(impossible_cuts & (cover_count == 1)[None, :]).any(axis=1)
+    report = {
+        "inequalities": len(impossible_cuts),
+        "uncovered": sbox.impossible[cover_count == 0].tolist(),
+        "wrongly_cut": [(int(i), int(v)) for i, v in zip(wrong_ineq, sbox.possible[wrong_point])],
+        "redundant": np.flatnonzero(redundant).tolist(),
+        "useless": np.flatnonzero(~impossible_cuts.any(axis=1)).tolist(),
+    }
+    report["valid"] = not report["uncovered"] and not report["wrongly_cut"]
+    return report
+
+
+def verify_many(models, sbox, constant_first=True):
+    # Checks several models (lists of inequalities) of the same S box with one evaluation of all their
+    # inequalities on all points. Returns one report per model, see verify
+    sizes = [len(model) for model in models]
+    stacked = [list(q) for model in models for q in model]
+    if not stacked:
+        none = np.zeros((0, len(sbox.possible)), dtype=bool), np.zeros((0, len(sbox.impossible)), dtype=bool)
+        return [diagnose(none[0], none[1], sbox) for _ in models]
+    possible_cuts = cut_matrix(stacked, sbox.possible_points, constant_first).to_bool()
+    impossible_cuts = cut_matrix(stacked, sbox.impossible_points, constant_first).to_bool()
+    reports = list()
+    offsets = np.cumsum([0] + sizes)
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        reports.append(diagnose(possible_cuts[start:end], impossible_cuts[start:end], sbox))
+    return reports
+
+
+def verify(inequalities, sbox, constant_first=True):
+    # Full check of a model of an S box (an SboxTransitions):
+    #   uncovered:   impossible transitions no inequality removes
+    #   wrongly_cut: (inequality index, possible transition) pairs where a valid transition is removed
+    #   redundant:   inequalities whose removed transitions are all removed by others as well
+    #   useless:     inequalities removing nothing (also redundant)
+    # Transitions are the integers (input difference << output bits) | output difference.
+    # valid is True when the model removes exactly the impossible transitions.
+    return verify_many([inequalities], sbox, constant_first)[0]
+
+
+def describe(report):
+    # One line summary of a report
+    if report["valid"] and not report["redundant"]:
+        return f"{report['inequalities']} inequalities, valid"
+    parts = [f"{report['inequalities']} inequalities"]
+    if report["uncovered"]:
+        parts.append(f"{len(report['uncovered'])} impossible transitions not removed")
+    if report["wrongly_cut"]:
+        parts.append(f"{len(report['wrongly_cut'])} possible transitions removed")
+    if report["redundant"]:
+        parts.append(f"{len(report['redundant'])} redundant")
+    return ", ".join(parts) + (", valid" if report["valid"] else ", INVALID")
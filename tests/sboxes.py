@@ -0,0 +1,10 @@
+# S boxes shared by the tests, in the catalogue format
+PRESENT = {"name": "PRESENT", "input": "4", "output": "4",
+           "s-box": {str(i): str(v) for i, v in enumerate([12, 5, 6, 11, 9, 0, 10, 13, 3, 14, 15, 8, 4, 7, 1, 2])}}
+GIFT = {"name": "GIFT", "input": "4", "output": "4",
+        "s-box": {str(i): str(v) for i, v in enumerate([1, 10, 4, 12, 6, 15, 3, 9, 2, 13, 11, 7, 5, 0, 8, 14])}}
+S3 = {"name": "S3", "input": "3", "output": "3",
+      "s-box": {str(i): str(v) for i, v in enumerate([0, 1, 3, 6, 7, 4, 5, 2])}}
+# Not a permutation, 4 input bits to 3 output bits
+COMPRESS = {"name": "COMPRESS", "input": "4", "output": "3",
+            "s-box": {str(i): str(v) for i, v in enumerate([3, 0, 7, 1, 5, 5, 2, 6, 4, 0, 1, 7, 6, 2, 3, 4])}}
@@ -0,0 +1,96 @@
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+from sbox_modeling.cover import heuristic_cover, min_cover
+from sbox_modeling.dominance import prune_dominated
+from sbox_modeling.greedy import greedy_reduce
+from sbox_modeling.kernel import CutMatrix
+from sbox_modeling.presolve import presolve_cover
+
+
+def random_cuts(seed, columns=12, rows=10, density=0.3):
+    # Random (inequalities x points) cut matrix; some points may be cut by no inequality
+    return np.random.default_rng(seed).random((columns, rows)) < density
+
+
+def brute_force_cover(cuts):
+    # Size of the smallest set of rows of cuts covering every coverable point
+    coverable = cuts.any(axis=0)
+    for size in range(len(cuts) + 1):
+        for subset in combinations(range(len(cuts)), size):
+            if (cuts[list(subset)].any(axis=0) >= coverable).all():
+                return size
+
+
+def is_cover(cuts, cover):
+    return (cuts[np.asarray(cover, dtype=np.int64)].any(axis=0) == cuts.any(axis=0)).all()
+
+
+def packed(cuts):
+    return CutMatrix(np.packbits(cuts, axis=1, bitorder='little'), cuts.shape[1])
+
+
+SEEDS = range(12)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_presolve_keeps_optimum(seed):
+    cuts = random_cuts(seed)
+    fixed, columns, rows, uncovered = presolve_cover(cuts)
+    assert uncovered.tolist() == np.flatnonzero(~cuts.any(axis=0)).tolist()
+    reduced = brute_force_cover(cuts[np.ix_(columns, rows)]) if len(rows) else 0
+    assert len(fixed) + reduced == brute_force_cover(cuts)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_heuristic_cover_bounds(seed):
+    cuts = random_cuts(seed)
+    optimum = brute_force_cover(cuts)
+    for matrix in (cuts, packed(cuts)):
+        cover, lower_bound = heuristic_cover(matrix, seed=0)
+        assert is_cover(cuts, cover)
+        assert lower_bound <= optimum <= len(cover)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_min_cover_heuristic(seed):
+    cuts = random_cuts(seed)
+    cover, lower_bound = min_cover(cuts, "heuristic")
+    assert is_cover(cuts, cover)
+    assert lower_bound <= brute_force_cover(cuts) <= len(cover)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_min_cover_exact(seed):
+    pytest.importorskip("highspy")
+    cuts = random_cuts(seed)
+    cover, lower_bound = min_cover(cuts, "exact", backend="highs", threads=1)
+    assert is_cover(cuts, cover)
+    assert len(cover) == lower_bound == brute_force_cover(cuts)
+
+
+def test_min_cover_rejects_unknown_method():
+    with pytest.raises(ValueError):
+        min_cover(random_cuts(0), "fastest")
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_greedy_reduce_covers(seed):
+    cuts = random_cuts(seed)
+    selected, choices = greedy_reduce(packed(cuts), "first")
+    assert len(set(selected)) == len(selected) == len(choices)
+    assert is_cover(cuts, selected)
+    assert len(selected) >= brute_force_cover(cuts)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_prune_dominated(seed):
+    cuts = random_cuts(seed, columns=30, rows=8, density=0.4)
+    kept = prune_dominated(cuts).tolist()
+    for i in range(len(cuts)):
+        # Kept unless another set contains it strictly, or an earlier one equals it
+        contained = [j for j in range(len(cuts)) if j != i and (cuts[j] >= cuts[i]).all()]
+        dominated = any((cuts[j] != cuts[i]).any() or j < i for j in contained)
+        assert (i in kept) == (not dominated)
@@ -0,0 +1,54 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from sbox_modeling.hull import convex_hull, primitive
+from sbox_modeling.tables import SboxTransitions
+from sboxes import PRESENT, S3
+
+spatial = pytest.importorskip("scipy.spatial")
+
+
+def qhull_facets(points):
+    # Facets from Qhull as primitive integer inequalities (b, a) with b + a x >= 0; Qhull gives
+    # normal.x + offset <= 0 in floating point, and triangulates facets into several equal ones
+    facets = set()
+    for equation in spatial.ConvexHull(np.asarray(points, dtype=float)).equations:
+        q = -np.concatenate([equation[-1:], equation[:-1]])
+        q /= np.abs(q).max()
+        facets.add(primitive([Fraction(c).limit_denominator(1000) for c in q]))
+    return sorted(facets)
+
+
+@pytest.mark.parametrize("raw", [S3, PRESENT], ids=lambda raw: raw["name"])
+@pytest.mark.parametrize("backend", ["numpy", "cdd"])
+def test_hull_matches_qhull(raw, backend):
+    if backend == "cdd":
+        pytest.importorskip("cdd")
+    points = SboxTransitions(raw).possible_points
+    facets = convex_hull(points, backend)
+    assert facets == qhull_facets(points)
+
+
+def test_hull_is_canonical():
+    # Sorted primitive integer vectors, whatever the order of the points
+    points = SboxTransitions(S3).possible_points
+    facets = convex_hull(points, "numpy")
+    assert facets == sorted(set(facets))
+    assert all(primitive(q) == q for q in facets)
+    assert convex_hull(points[::-1], "numpy") == facets
+
+
+def test_facets_are_tight_and_valid():
+    points = SboxTransitions(PRESENT).possible_points.astype(np.int64)
+    Q = np.array(convex_hull(points, "numpy"))
+    values = Q[:, :1] + Q[:, 1:] @ points.T
+    assert (values >= 0).all()
+    # A facet of an 8-dimensional polytope touches at least 8 vertices
+    assert ((values == 0).sum(axis=1) >= points.shape[1]).all()
+
+
+def test_hull_rejects_lower_dimensional_sets():
+    with pytest.raises(ValueError):
+        convex_hull([[0, 0, 0], [1, 0, 0], [0, 1, 0]], "numpy")
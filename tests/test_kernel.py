@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from sbox_modeling.kernel import cut_matrix, evaluate, tight_index
+
+
+def random_system(rng, count=40, n=6):
+    inequalities = rng.integers(-3, 4, size=(count, n+1))
+    points = rng.integers(0, 2, size=(70, n))
+    return inequalities, points
+
+
+@pytest.mark.parametrize("constant_first", [True, False])
+def test_cut_matrix_matches_definition(constant_first):
+    rng = np.random.default_rng(1)
+    Q, P = random_system(rng)
+    b, A = (Q[:, 0], Q[:, 1:]) if constant_first else (Q[:, -1], Q[:, :-1])
+    values = np.array([[int(b[i]) + sum(int(a) * int(x) for a, x in zip(A[i], p)) for p in P] for i in range(len(Q))])
+    assert evaluate(Q.tolist(), P, constant_first).tolist() == values.tolist()
+    cuts = cut_matrix(Q.tolist(), P, constant_first)
+    assert cuts.to_bool().tolist() == (values < 0).tolist()
+    assert cuts.counts().tolist() == (values < 0).sum(axis=1).tolist()
+    assert cuts.covered().tolist() == (values < 0).any(axis=0).tolist()
+    assert cuts.row(3).tolist() == np.flatnonzero(values[3] < 0).tolist()
+    assert cuts.bitsets()[5] == sum(1 << j for j in np.flatnonzero(values[5] < 0).tolist())
+    index = tight_index(Q.tolist(), P, constant_first)
+    assert [sorted(index[j]) for j in range(len(P))] == [np.flatnonzero(values[:, j] == 0).tolist() for j in range(len(P))]
+
+
+def test_memory_mapped_cut_matrix(tmp_path):
+    rng = np.random.default_rng(2)
+    Q, P = random_system(rng)
+    in_memory = cut_matrix(Q.tolist(), P)
+    mapped = cut_matrix(Q.tolist(), P, out=str(tmp_path / "cuts.npy"))
+    assert mapped.to_bool().tolist() == in_memory.to_bool().tolist()
+    assert np.load(tmp_path / "cuts.npy").tolist() == in_memory.packed.tolist()
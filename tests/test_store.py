@@ -0,0 +1,35 @@
+import numpy as np
+
+from sbox_modeling.store import ResultStore
+
+
+def test_round_trip(tmp_path):
+    store = ResultStore(str(tmp_path))
+    present = [[1, -1, 0, 2], [0, 3, -2, 1]]
+    store.put("modified", "PRESENT", present, variant="first")
+    # MILP outputs put the constant last; the store keeps it first
+    store.put("modified", "GIFT", [[-1, 0, 2, 5]], variant="first", constant_first=False)
+    results = store.load("modified")
+    assert results.get("PRESENT", variant="first").tolist() == present
+    assert results.get("GIFT", variant="first").tolist() == [[5, -1, 0, 2]]
+    assert results.get("PRESENT", variant="last") is None
+
+
+def test_replace(tmp_path):
+    store = ResultStore(str(tmp_path))
+    store.put("greedy", "PRESENT", [[1, 2, 3]])
+    store.put("greedy", "PRESENT", [[4, 5, 6], [7, 8, 9]])
+    assert store.load("greedy").get("PRESENT").tolist() == [[4, 5, 6], [7, 8, 9]]
+
+
+def test_empty_system(tmp_path):
+    # An empty model (no solution, or no impossible transitions) must not break later puts and loads
+    store = ResultStore(str(tmp_path))
+    store.put("greedy", "EMPTY", [])
+    store.put("direct", "EMPTY", np.zeros((0, 9), dtype=np.int64))
+    store.put("greedy", "PRESENT", [[1, 2, 3]])
+    greedy = store.load("greedy")
+    assert greedy.get("EMPTY").shape[0] == 0
+    assert greedy.get("PRESENT").tolist() == [[1, 2, 3]]
+    assert store.load("direct").get("EMPTY").shape == (0, 9)
+    assert len(dict(greedy.systems())) == 2
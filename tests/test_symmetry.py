@@ -0,0 +1,57 @@
+from itertools import permutations
+
+import numpy as np
+
+from sbox_modeling.symmetry import point_ids, symmetry_group, transform, orbit
+from sbox_modeling.tables import SboxTransitions
+from sboxes import S3
+
+
+def brute_force_group(points, n):
+    # Every bit permutation and XOR translation mapping the point set onto itself
+    member = set(point_ids(points).tolist())
+    found = list()
+    for perm in permutations(range(n)):
+        for t in range(1 << n):
+            bits = np.array([(t >> (n-1-i)) & 1 for i in range(n)])
+            Y = np.zeros_like(points)
+            Y[:, list(perm)] = points
+            if set(point_ids(Y ^ bits).tolist()) == member:
+                found.append((tuple(perm), t))
+    return sorted(found)
+
+
+def test_group_of_s3():
+    points = SboxTransitions(S3).possible_points
+    n = points.shape[1]
+    group = symmetry_group(points)
+    assert (group[0][0] == np.arange(n)).all() and not group[0][1].any()
+    found = sorted((tuple(perm.tolist()), int(point_ids(t[None, :])[0])) for perm, t in group)
+    assert found == brute_force_group(np.asarray(points, dtype=np.int64), n)
+
+
+def test_transform_preserves_values():
+    n = 4
+    rng = np.random.default_rng(0)
+    X = (np.arange(1 << n)[:, None] >> np.arange(n-1, -1, -1)[None, :]) & 1
+    for _ in range(20):
+        perm = rng.permutation(n)
+        t = rng.integers(0, 2, size=n)
+        q = rng.integers(-5, 6, size=n+1)
+        Y = np.zeros_like(X)
+        Y[:, perm] = X
+        Y ^= t
+        image = np.array(transform(q, perm, t))
+        assert (image[0] + Y @ image[1:]).tolist() == (q[0] + X @ q[1:]).tolist()
+        # The constant last order gives the same image, rotated
+        last = transform(np.roll(q, -1), perm, t, constant_first=False)
+        assert list(last) == np.roll(image, -1).tolist()
+
+
+def test_orbit_starts_with_itself():
+    points = SboxTransitions(S3).possible_points
+    group = symmetry_group(points)
+    q = (1, -1, 0, 0, 1, 0, -1)
+    images = orbit(q, group)
+    assert images[0] == q
+    assert len(set(images)) == len(images) <= len(group)
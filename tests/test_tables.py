@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from sbox_modeling.tables import SboxTransitions, get_sbox, gen_table, get_transitions, point_matrix
+from sboxes import PRESENT, GIFT, S3, COMPRESS
+
+
+def parity(v):
+    return bin(v).count("1") & 1
+
+
+def naive_DDT(m, k, s):
+    T = np.zeros((2**m, 2**k), dtype=int)
+    for x in range(2**m):
+        for a in range(2**m):
+            T[a, s[x] ^ s[x ^ a]] += 1
+    return T
+
+
+def naive_LAT(m, k, s):
+    T = np.zeros((2**m, 2**k), dtype=int)
+    for a in range(2**m):
+        for b in range(2**k):
+            T[a, b] = sum(parity(a & x) == parity(b & s[x]) for x in range(2**m)) - 2**(m-1)
+    return T
+
+
+def naive_BCT(m, k, s):
+    inverse = {y: x for x, y in enumerate(s)}
+    T = np.zeros((2**m, 2**k), dtype=int)
+    for a in range(2**m):
+        for b in range(2**k):
+            T[a, b] = sum(inverse[s[x] ^ b] ^ inverse[s[x ^ a] ^ b] == a for x in range(2**m))
+    return T
+
+
+def naive_DPT(m, k, s):
+    # trail[u][v]: the ANF of prod_{i in v} S_i(x) has a monomial x^w with w covering u
+    trail = np.zeros((2**m, 2**k), dtype=bool)
+    for v in range(2**k):
+        f = [int(s[x] & v == v) for x in range(2**m)]
+        monomials = [w for w in range(2**m) if sum(f[x] for x in range(2**m) if x & w == x) & 1]
+        for u in range(2**m):
+            trail[u, v] = any(w & u == u for w in monomials)
+    T = np.zeros((2**m, 2**k), dtype=int)
+    for u in range(2**m):
+        for v in range(2**k):
+            smaller = any(trail[u, w] for w in range(2**k) if w & v == w and w != v)
+            T[u, v] = int(trail[u, v] and not smaller)
+    return T
+
+
+NAIVE = {"DDT": naive_DDT, "LAT": naive_LAT, "BCT": naive_BCT, "DPT": naive_DPT}
+
+
+@pytest.mark.parametrize("table_type", ["DDT", "LAT", "BCT", "DPT"])
+@pytest.mark.parametrize("raw", [PRESENT, GIFT, S3], ids=lambda raw: raw["name"])
+def test_table_matches_definition(table_type, raw):
+    _, m, k, s = get_sbox(raw)
+    assert gen_table(table_type, m, k, s).tolist() == NAIVE[table_type](m, k, s).tolist()
+
+
+@pytest.mark.parametrize("table_type", ["DDT", "LAT", "DPT"])
+def test_non_square_table(table_type):
+    _, m, k, s = get_sbox(COMPRESS)
+    assert gen_table(table_type, m, k, s).tolist() == NAIVE[table_type](m, k, s).tolist()
+
+
+def test_bct_needs_permutation():
+    _, m, k, s = get_sbox(COMPRESS)
+    with pytest.raises(ValueError):
+        gen_table("BCT", m, k, s)
+
+
+def test_transitions_and_points():
+    sbox = SboxTransitions(PRESENT)
+    table = naive_DDT(4, 4, sbox.s_box)
+    possible, impossible = get_transitions(4, 4, table)
+    assert sorted(possible.tolist() + impossible.tolist()) == list(range(256))
+    assert all(table[v >> 4, v & 15] != 0 for v in possible)
+    assert all(table[v >> 4, v & 15] == 0 for v in impossible)
+    # Bits of (input << 4) | output, most significant first
+    assert point_matrix([0b10010011], 8).tolist() == [[1, 0, 0, 1, 0, 0, 1, 1]]
+    assert sbox.possible_points.tolist() == point_matrix(possible, 8).tolist()